@@ -0,0 +1,114 @@
+# Micro-benchmarks of the CPU search on fixed, seeded positions, e.g.
+#   python benchmark.py --output bench.json
+#   python benchmark.py --output new.json --compare bench.json
+import argparse, json, os, platform, random, subprocess, time, tracemalloc
+from game2 import *
+from mcts2 import *
+
+SEED = 2017
+MCTS_ITERATIONS = 2000
+
+
+def positions():
+    """{name: SearchState} for the opening, the middle and the last picks of a round, with 2/3/4 players."""
+    found = {}
+    for num_players in (2, 3, 4):
+        rng = random.Random(SEED + num_players)
+        game = Game(num_players, seed=SEED + num_players)
+        found[f"opening_{num_players}p"] = game.search_state()
+        # the middle and end of the second round, so the walls aren't empty
+        while game.round_number < 2:
+            game.apply(rng.choice(game.legal_moves()))
+        tiles = sum(map(sum, game.state.factories))
+        while sum(map(sum, game.state.factories)) + sum(game.state.pot) > tiles // 2:
+            game.apply(rng.choice(game.legal_moves()))
+        found[f"mid_round_{num_players}p"] = game.search_state()
+        while sum(1 for factory in game.state.factories + [game.state.pot] if any(factory)) > 2:
+            game.apply(rng.choice(game.legal_moves()))
+        found[f"last_picks_{num_players}p"] = game.search_state()
+    return found
+
+
+def rate(function, seconds=0.2):
+    """Calls per second of function, run for about the given time."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            function()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def bench_position(state):
+    moves = state.legal_moves()
+    move = moves[len(moves) // 2]
+
+    def make_move():
+        state.apply(move)
+        state.undo(move)
+
+    results = {
+        "legal_moves_per_s": rate(lambda: get_legal_moves(state)),
+        "make_move_per_s": rate(make_move),
+        "get_reward_per_s": rate(lambda: get_reward(state)),
+    }
+    for difficulty in ("easy", "hard"):
+        start = time.perf_counter()
+        search(state, difficulty)
+        results[f"{difficulty}_iterations_per_s"] = MCTS_ITERATIONS / (time.perf_counter() - start)
+    # in a separate run as tracemalloc slows the search down; easy, so the
+    # rollout batch arrays don't count as tree memory
+    tracemalloc.start()
+    mcts = search(state, "easy")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["peak_bytes_per_node"] = peak / (mcts.nodes_done + 1)
+    return results
+
+
+def search(state, difficulty):
+    """Seeded search of MCTS_ITERATIONS iterations from state, returns the MCTS."""
+    mcts = MCTS(iterations=MCTS_ITERATIONS, difficulty=difficulty, seed=SEED, batch_size=ROLLOUT_BATCH)
+    root = Node(state.key)
+    mcts.search(root, state, state.player + 1)
+    return mcts
+
+
+def commit():
+    """Short hash of the checked out commit, so runs can be told apart."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, old):
+    """Print each measurement next to the old run's, as a percentage change."""
+    print(f"{'position':18} {'measurement':26} {'old':>12} {'new':>12} {'change':>8}")
+    for name, measurements in results["positions"].items():
+        for key, value in measurements.items():
+            old_value = old["positions"].get(name, {}).get(key)
+            if old_value:
+                print(f"{name:18} {key:26} {old_value:12.1f} {value:12.1f} {100*(value/old_value - 1):+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CPU search on seeded positions.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = {"commit": commit(), "python": platform.python_version(), "numpy": np is not None,
+               "iterations": MCTS_ITERATIONS, "positions": {}}
+    for name, state in positions().items():
+        results["positions"][name] = bench_position(state)
+        print(name, {key: round(value, 1) for key, value in results["positions"][name].items()})
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
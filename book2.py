@@ -0,0 +1,110 @@
+# Opening book: best moves of round-one positions, from long offline searches
+#   python book2.py --positions 500 --players 2 3 4 --ms 10000
+# adds that many seeded positions per CPU seat to opening_book.bin
+import argparse, multiprocessing, os, struct
+from state2 import *
+from game2 import Game
+from mcts2 import MCTS, Node, SearchBudget, ROLLOUT_BATCH, move_priors
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+RECORD = struct.Struct("<QH")  # canonical Zobrist key, encode_move code in the canonical position
+
+_book = None
+
+
+def canonical(state):
+    """
+    (key, order) of a round-one position: factories are interchangeable, so
+    they are sorted, and key is the Zobrist key with the sorted factories.
+    order[i] is the factory of state that is i-th in sorted order. None when
+    it's not round one (someone's wall has tiles).
+    """
+    if any(state.walls):
+        return None
+    order = sorted(range(len(state.factories)), key=lambda i: state.factories[i])
+    sorted_state = state.copy()
+    sorted_state.factories = [state.factories[i] for i in order]
+    return sorted_state.compute_key(), order
+
+
+def load_book(path=BOOK_FILE):
+    """{canonical key: move code}, empty when there is no book."""
+    book = {}
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            data = file.read()
+        for key, code in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+            book[key] = code
+    return book
+
+
+def save_book(book, path=BOOK_FILE):
+    with open(path, "wb") as file:
+        for key in sorted(book):
+            file.write(RECORD.pack(key, book[key]))
+
+
+def book_move(state):
+    """Book move for state as (source, colour, count, line), None if it's not in the book."""
+    global _book
+    found = canonical(state)
+    if found is None:
+        return None
+    if _book is None:
+        _book = load_book()
+    key, order = found
+    code = _book.get(key)
+    if code is None:
+        return None
+    source, line = divmod(code, 6)
+    source, colour = divmod(source, 5)
+    if source < len(order):
+        source = order[source]  # back to the factory's place in state
+    move = (source, colour, (state.factories + [state.pot])[source][colour], line)
+    return move if move in state.legal_moves() else None
+
+
+def opening_position(num_players, seed, seat):
+    """
+    Seeded round-one position as the CPU in seat (0-based) first sees it: the
+    human in seat 0 opens the game, so every seat before it has made its
+    first pick, the one move_priors likes best.
+    """
+    game = Game(num_players, seed=seed)
+    for _ in range(seat):
+        moves = game.legal_moves()
+        priors = move_priors(game.state, moves)
+        game.apply(moves[priors.index(max(priors))])
+    return game.search_state()
+
+
+def search_position(args):
+    """Best move code of one seeded round-one position of a CPU seat, in its canonical form."""
+    num_players, seed, seat, ms = args
+    state = opening_position(num_players, seed, seat)
+    key, order = canonical(state)
+    state.factories = [state.factories[i] for i in order]
+    state.key = key
+    mcts = MCTS(difficulty="hard", seed=seed, batch_size=ROLLOUT_BATCH)
+    source, colour, _, line = mcts.search(Node(state.key), state, state.player + 1, SearchBudget(ms=ms))
+    return key, encode_move(source, colour, line)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Add searched round-one positions to the opening book.")
+    parser.add_argument("--positions", type=int, default=100, help="positions per number of players and CPU seat")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--ms", type=float, default=10000, help="search time per position")
+    parser.add_argument("--seed", type=int, default=0, help="first game seed")
+    parser.add_argument("--output", default=BOOK_FILE)
+    args = parser.parse_args()
+
+    book = load_book(args.output)
+    jobs = [(num_players, args.seed + i, seat, args.ms) for num_players in args.players
+            for seat in range(1, num_players) for i in range(args.positions)]
+    with multiprocessing.Pool() as pool:
+        for key, code in pool.imap_unordered(search_position, jobs):
+            book[key] = code
+    save_book(book, args.output)
+    print(f"{len(book)} positions in {args.output}")
@@ -0,0 +1,118 @@
+# Persistent evaluation cache: search results of positions, kept between games in a memory-mapped file
+import hashlib, mmap, os, random, struct
+from state2 import *
+
+CACHE_DIR = os.environ.get("ANDROID_PRIVATE") or os.path.join(os.path.expanduser("~"), ".azugo")
+CACHE_FILE = os.path.join(CACHE_DIR, "eval_cache.bin")
+CACHE_SLOTS = 1 << 17  # size cap: 16 bytes a slot, so 2 MB
+BUCKET = 4  # slots a position may go in, the one with the fewest visits is evicted
+CACHE_MIN_VISITS = 64  # nodes with fewer visits aren't worth storing
+CACHE_SEED_VISITS = 32  # a new tree node starts with at most this many of its cached visits
+CACHE_ANSWER_VISITS = 4096  # a position searched this much before isn't searched again
+CACHE_VERSION = 2  # layout of the file, files of another version are cleared
+# check = key ^ data, data = visits | move code << 16 | float32 value << 32,
+# so a slot torn by two processes writing at once reads as a miss
+RECORD = struct.Struct("<QQ")
+VALUE = struct.Struct("<f")
+# the file starts with (CACHE_VERSION, hash of the search settings), one record long
+HEADER = struct.Struct("<QQ")
+
+# values are from one player's point of view, so positions are keyed per searching player
+_rng = random.Random(2018)
+SEARCHER_KEYS = [_rng.getrandbits(64) for _ in range(MAX_PLAYERS)]
+
+
+class EvalCache:
+    """
+    Fixed-size hash table of (visits, value, best move code) by position key,
+    shared through the file by every search process. Values are the MCTS
+    averages of the hard difficulty for the given (0-based) player.
+    settings: description of how the searches evaluate positions; values
+    stored with other settings (or by another version) are dropped.
+    """
+    def __init__(self, path=CACHE_FILE, slots=CACHE_SLOTS, settings=""):
+        self.slots = slots
+        size = (slots + 1) * RECORD.size
+        with open(path, "a+b") as file:
+            if os.path.getsize(path) != size:
+                file.truncate(size)  # a new file, or one of another size: start over
+            self.map = mmap.mmap(file.fileno(), size)
+        digest = hashlib.blake2b(settings.encode(), digest_size=8).digest()
+        header = (CACHE_VERSION, int.from_bytes(digest, "little"))
+        if HEADER.unpack_from(self.map, 0) != header:
+            # cleared in place rather than truncated, another process may have the file mapped
+            self.map[:] = bytes(size)
+            HEADER.pack_into(self.map, 0, *header)
+
+    def _bucket(self, key):
+        return key % (self.slots // BUCKET) * BUCKET
+
+    def _read(self, slot):
+        check, data = RECORD.unpack_from(self.map, (slot + 1) * RECORD.size)
+        return check ^ data, data
+
+    def lookup(self, key, player):
+        """(visits, value, move code) of the position with this Zobrist key, None on a miss."""
+        key ^= SEARCHER_KEYS[player]
+        first = self._bucket(key)
+        for slot in range(first, first + BUCKET):
+            found, data = self._read(slot)
+            if found == key and data:
+                return data & 0xFFFF, VALUE.unpack(struct.pack("<I", data >> 32))[0], data >> 16 & 0xFFFF
+        return None
+
+    def store(self, key, player, visits, value, code):
+        """
+        Keep the result, unless the position is already stored with more
+        visits. Otherwise it takes an empty slot or evicts the entry with the
+        fewest visits of its bucket.
+        """
+        key ^= SEARCHER_KEYS[player]
+        first = self._bucket(key)
+        victim, victim_visits = first, None
+        for slot in range(first, first + BUCKET):
+            found, data = self._read(slot)
+            if found == key and data:
+                if data & 0xFFFF > visits:
+                    return
+                victim = slot
+                break
+            if victim_visits is None or data & 0xFFFF < victim_visits:
+                victim, victim_visits = slot, data & 0xFFFF
+        data = min(visits, 0xFFFF) | code << 16 | struct.unpack("<I", VALUE.pack(value))[0] << 32
+        RECORD.pack_into(self.map, (victim + 1) * RECORD.size, key ^ data, data)
+
+    def store_tree(self, root, player):
+        """
+        Store every node under root with at least CACHE_MIN_VISITS visits of
+        its own: the ones seeded from this cache are left out, or every search
+        would store its prior again as new visits.
+        """
+        seen = set()
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            visits = node.visits - node.seed_visits
+            if node.key in seen or visits < CACHE_MIN_VISITS or not node.children:
+                continue
+            seen.add(node.key)
+            best = max(range(len(node.children)), key=lambda i: node.children[i].visits)
+            self.store(node.key, player, visits, (node.wins - node.seed_wins) / visits, node.moves[best])
+            stack.extend(node.children)
+
+    def close(self):
+        self.map.close()
+
+
+_cache = None
+
+def get_eval_cache(settings=""):
+    """Shared cache of this process, None where the file can't be made (the search goes on without)."""
+    global _cache
+    if _cache is None:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _cache = EvalCache(settings=settings)
+        except (OSError, ValueError):
+            _cache = False
+    return _cache or None
@@ -0,0 +1 @@
+# lets pytest import the game modules from the repository root
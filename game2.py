@@ -0,0 +1,179 @@
+# Headless Azul rules (no pygame): the same game GamePage plays, without sprites or animations
+import random
+from state2 import *
+from scoring2 import *
+
+MINUS_SCORES = [-1, -1, -2, -2, -2, -3, -3]  # per tile on the minus tower, as GameBoard.score_tile
+ROW_BONUS, COL_BONUS, COLOUR_BONUS = 2, 7, 10
+
+
+class Game:
+    """
+    A whole game for num_players players. The round in progress is a
+    SearchState (state), so moves are the (source, colour, count, line) tuples
+    of SearchState.legal_moves and a position can be handed to the CPU search
+    as is. On top of it Game keeps what the search leaves out:
+    scores: per player score
+    bag, lid: colour counts still to draw and discarded (refilled into the bag when it runs out)
+    floor_tiles: per player colours on the minus tower, without the 'one' tile
+    The player holding the 'one' tile (state.first_player) starts the next round.
+    """
+    def __init__(self, num_players=2, seed=None):
+        self.rng = random.Random(seed)
+        self.num_players = num_players
+        self.scores = [0]*num_players
+        self.bag = [20]*5
+        self.lid = [0]*5
+        self.floor_tiles = [[] for _ in range(num_players)]
+        self.round_number = 0
+        self.over = False
+        self.state = SearchState([0]*num_players, [[(-1, 0)]*5 for _ in range(num_players)], [0]*num_players,
+                                 [], [0]*5, False, 0)
+        self.start_round()
+
+    @classmethod
+    def from_search_state(cls, state, rng):
+        """
+        Game continuing from a SearchState (taken over, not copied) with all
+        scores at 0, for looking past the end of the round. The tiles not in
+        sight are split into bag and lid using state.bag (all in the bag when it
+        is None); the colours on the minus towers aren't known, so they are
+        counted in the lid straight away.
+        """
+        game = cls.__new__(cls)
+        game.rng = rng
+        game.num_players = state.num_players
+        game.scores = [0]*state.num_players
+        game.floor_tiles = [[] for _ in range(state.num_players)]
+        game.round_number = 0
+        game.over = False
+        game.state = state
+        unseen = [20]*5
+        for wall in state.walls:
+            for colour in range(5):
+                unseen[colour] -= bin(wall & COLOUR_MASKS[colour]).count("1")
+        for lines in state.lines:
+            for colour, count in lines:
+                if count:
+                    unseen[colour] -= count
+        for counts in state.factories + [state.pot]:
+            for colour in range(5):
+                unseen[colour] -= counts[colour]
+        game.bag = list(state.bag) if state.bag is not None else unseen
+        game.lid = [max(0, tiles - bag) for tiles, bag in zip(unseen, game.bag)]
+        return game
+
+    @property
+    def player(self):
+        return self.state.player
+
+    def refill_bag(self):
+        """Put the discarded tiles back in the bag (GamePage.refill_bag_of_tiles)."""
+        self.bag = self.lid
+        self.lid = [0]*5
+
+    def draw_tile(self):
+        """Colour of a random tile from the bag, None if there are no tiles left at all."""
+        if not any(self.bag):
+            self.refill_bag()
+            if not any(self.bag):
+                return None
+        pick = self.rng.randrange(sum(self.bag))
+        for colour, count in enumerate(self.bag):
+            if pick < count:
+                self.bag[colour] -= 1
+                return colour
+            pick -= count
+
+    def start_round(self):
+        """Fill the factories with 4 tiles each and put the 'one' tile in the pot."""
+        self.round_number += 1
+        state = self.state
+        state.factories = []
+        for _ in range(2*self.num_players + 1):
+            counts = [0]*5
+            for _ in range(4):
+                colour = self.draw_tile()
+                if colour is not None:
+                    counts[colour] += 1
+            state.factories.append(tuple(counts))
+        state.pot = [0]*5
+        state.pot_one = True
+        state.player = max(state.first_player, 0)
+        state.first_player = -1
+        state.history = []
+        state.key = state.compute_key()
+
+    def legal_moves(self):
+        return self.state.legal_moves()
+
+    def apply(self, move):
+        """Play move for the player to move, then score the round and refill (or end the game) when it is over."""
+        state = self.state
+        source, colour, count, line = move
+        player = state.player
+        takes_one = source == len(state.factories) and state.pot_one
+        floor = state.floors[player]
+        line_count = state.lines[player][line - 1][1] if line else 0
+        state.apply(move)
+        state.history = []  # a game is never taken back
+
+        placed = state.lines[player][line - 1][1] - line_count if line else 0
+        # the 'one' tile goes first, it may fill the minus tower itself
+        on_floor = state.floors[player] - min(FLOOR_SIZE, floor + takes_one)
+        self.floor_tiles[player] += [colour]*on_floor
+        # what doesn't fit on the minus tower either is discarded
+        self.lid[colour] += count - placed - on_floor
+
+        if state.is_terminal():
+            self.score_round()
+            if self.is_game_over():
+                self.score_end_game()
+                self.over = True
+            else:
+                self.start_round()
+
+    def score_round(self):
+        """Move full towers to the wall and score them, then the minus towers (GamePage scoring phases)."""
+        state = self.state
+        for player in range(self.num_players):
+            wall = state.walls[player]
+            score = self.scores[player]
+            for row, (colour, count) in enumerate(state.lines[player]):
+                if count != row + 1:
+                    continue
+                score += placement_score(wall, row, colour)
+                wall |= WALL_BITS[row][colour]
+                self.lid[colour] += row  # the rest of the tower is discarded
+                state.lines[player][row] = (-1, 0)
+            for i in range(state.floors[player]):
+                score = max(0, score + MINUS_SCORES[i])
+            for colour in self.floor_tiles[player]:
+                self.lid[colour] += 1
+            self.floor_tiles[player] = []
+            state.floors[player] = 0
+            state.walls[player] = wall
+            self.scores[player] = score
+        state.key = state.compute_key()
+
+    def is_game_over(self):
+        """The game ends after the round in which someone completes a wall row."""
+        return any(wall & row_mask == row_mask for wall in self.state.walls for row_mask in ROW_MASKS)
+
+    def score_end_game(self):
+        """Bonuses for every full row, column and colour."""
+        for player, wall in enumerate(self.state.walls):
+            self.scores[player] += (ROW_BONUS*sum(wall & mask == mask for mask in ROW_MASKS)
+                                    + COL_BONUS*sum(wall & mask == mask for mask in COL_MASKS)
+                                    + COLOUR_BONUS*sum(wall & mask == mask for mask in COLOUR_MASKS))
+
+    def winners(self):
+        """Players (0-based) with the highest score, more than one on a tie."""
+        best = max(self.scores)
+        return [player for player, score in enumerate(self.scores) if score == best]
+
+    def search_state(self):
+        """Copy of the round in progress for the CPU search."""
+        state = self.state.copy()
+        state.bag = tuple(self.bag)
+        return state
@@ -1,7 +1,7 @@
 import pygame
 import math
 import random
-from pygame.sprite import Sprite, Group, LayeredUpdates
+from pygame.sprite import Sprite, DirtySprite, Group, LayeredUpdates
 from pygame.locals import *
 from pathlib import Path
 import sys
@@ -18,6 +18,12 @@ else:
 resources_path = base_path / "resources"
 
 FPS = 30
+# dirty rects merge into one while that adds less than this many pixels (a
+# separate blit and display update is worth about that much), at most this many are kept
+DIRTY_RECT_COST = 64*64
+MAX_DIRTY_RECTS = 8
+# draw order of a page's sprites, bottom first (SceneRenderer layers)
+LAYER_BOARD, LAYER_DRAGGED, LAYER_POPUP, LAYER_BUTTON, LAYER_TEXT_INPUT, LAYER_TITLE, LAYER_TEXT = range(7)
 
 # Colours
 WHITE = (255, 255, 255)
@@ -92,6 +98,8 @@ class GameState:
         self.font = base_path / 'resources' / "boucherie.ttf"
         self.player_names = [f"Player {i+1}" for i in range(4)]
         self.rects_to_draw = []
+        # "dirty": pygame.display.update() of the dirty rects only, "flip": the whole window every frame
+        self.present_mode = "dirty"
 
     def get_background(self):
         if self.mode == "light":
@@ -121,14 +129,73 @@ game_state = GameState()
 # Page Classes
 #############################
 
+class SceneRenderer(LayeredUpdates):
+    """
+    Draws a page's sprites layer by layer, each with its own draw(): they are
+    made of several images (a board with its towers, tiles and texts), which
+    LayeredDirty's blit of sprite.image can't draw. Sprites outside the
+    surface's clip are skipped. Dirty sprites are turned into dirty rects.
+    Only the top-level sprites the page's groups hold are DirtySprites; their
+    children (a board's towers, the tiles) are plain Sprites whose redraws are
+    added to game_state.rects_to_draw by hand, dragged tiles included.
+    """
+    def __init__(self):
+        super().__init__()
+        self.drawn_rects = {}  # sprite -> its drawn_rect when it was last dirty
+
+    def draw(self, surface):
+        clip = surface.get_clip()
+        for sprite in self.sprites():
+            if clip.colliderect(drawn_rect(sprite)):
+                sprite.draw(surface)
+
+    def mark_dirty_rects(self):
+        """Add where each dirty sprite was and is to game_state.rects_to_draw, and clear its flag (dirty 2 stays)."""
+        for sprite in self.sprites():
+            if getattr(sprite, "dirty", 0):
+                rect = drawn_rect(sprite)
+                old_rect = self.drawn_rects.get(sprite)
+                if old_rect:
+                    game_state.rects_to_draw.append(old_rect)
+                game_state.rects_to_draw.append(rect)
+                self.drawn_rects[sprite] = rect
+                if sprite.dirty == 1:
+                    sprite.dirty = 0
+
+    def remove_internal(self, sprite):
+        # what it drew has to go
+        old_rect = self.drawn_rects.pop(sprite, None)
+        if old_rect:
+            game_state.rects_to_draw.append(old_rect)
+        super().remove_internal(sprite)
+
+
+class LayerGroup(Group):
+    """A page's group, whose sprites are also drawn by the page's SceneRenderer on the given layer."""
+    def __init__(self, renderer, layer):
+        self.renderer = renderer
+        self.layer = layer
+        super().__init__()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.renderer.add(sprite, layer=self.layer)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.renderer.remove(sprite)
+
+
 class Page():
     def __init__(self):
-        self.buttons = Group()
-        self.text_inputs = Group()
-        self.titles = Group()
-        self.texts = Group()
-        self.sprites = Group()
-        self.popups = Group()
+        self.renderer = SceneRenderer()
+        self.buttons = LayerGroup(self.renderer, LAYER_BUTTON)
+        self.text_inputs = LayerGroup(self.renderer, LAYER_TEXT_INPUT)
+        self.titles = LayerGroup(self.renderer, LAYER_TITLE)
+        self.texts = LayerGroup(self.renderer, LAYER_TEXT)
+        self.sprites = LayerGroup(self.renderer, LAYER_BOARD)
+        self.popups = LayerGroup(self.renderer, LAYER_POPUP)
+        self.dragged_tiles = LayerGroup(self.renderer, LAYER_DRAGGED)  # the tiles being dragged, drawn over the boards
         self.build()
     
     def handle_event(self, event):
@@ -170,28 +237,13 @@ class Page():
         self.texts.update()
         self.sprites.update(dt)
         self.popups.update()
+        self.renderer.mark_dirty_rects()
 
     def draw(self, surface):
+        # only the surface's clip (the dirty region) is cleared and redrawn,
+        # sprites drawing nothing inside it are skipped
         surface.fill((0, 0, 0, 0))
-        for sprite in self.sprites:
-            sprite.draw(surface)
-        for sprite in [sprite for sprite in self.sprites if hasattr(sprite, "tiles")]:
-            for tile in sprite.tiles:
-                if tile.dragging:
-                    dragging_tiles = [t for t in tile.parent.tiles if t.colour == tile.colour]
-                    for tile in dragging_tiles:
-                        tile.draw(surface)
-                    break
-        for popup in self.popups:
-            popup.draw(surface)
-        for button in self.buttons:
-            button.draw(surface)
-        for input_box in self.text_inputs:
-            input_box.draw(surface)
-        for title in self.titles:
-            title.draw(surface)
-        for text in self.texts:
-            text.draw(surface)
+        self.renderer.draw(surface)
         
 
 
@@ -810,7 +862,7 @@ class PlayerNames(Page):
 # UI SPRITES
 #############################
 
-class UIButton(Sprite):
+class UIButton(DirtySprite):
     def __init__(self, pos_ratio, height_ratio, image, clicked_image=None, angle=None, callback=lambda: None, visible=True):
         super().__init__()
         self.pos_ratio = pos_ratio
@@ -995,7 +1047,7 @@ class UIText(Sprite):
         surface.blit(self.rendered_text, self.rect.topleft)
 
 
-class Popup(Sprite):
+class Popup(DirtySprite):
     def __init__(self, parent, idx):
         super().__init__()
         self.parent = parent
@@ -1208,6 +1260,7 @@ class Tile(Sprite):
                 if self.rect.collidepoint(event.scaled_pos):
                     self.dragging = True
                     dragging_tiles = [tile for tile in self.parent.tiles if tile.colour == self.colour]
+                    game.dragged_tiles.add(*dragging_tiles)
                     for i, tile in enumerate(dragging_tiles):
                         tile.drag_offset = (-tile.rect.width*1.04*(i), 0)
                         new_tile_pos = (event.scaled_pos[0]+tile.drag_offset[0], event.scaled_pos[1]+tile.drag_offset[1])
@@ -1253,6 +1306,7 @@ class Tile(Sprite):
                         for i, tile in enumerate([tile for tile in tiles_to_move]):
                             snap(tile, poses[i], sizes[i])
                     self.dragging = False
+                    game.dragged_tiles.empty()
 
             elif event.type in (pygame.MOUSEMOTION, pygame.FINGERMOTION):
                 if self.dragging:
@@ -1281,7 +1335,7 @@ class Tile(Sprite):
 
 
 # FACTORY CLASS
-class Factory(Sprite):
+class Factory(DirtySprite):
     def __init__(self, parent, idx):
         super().__init__()
         self.parent = parent
@@ -1504,7 +1558,7 @@ class Text(Sprite):
 
 
 # GAMEBOARD CLASS
-class GameBoard(Sprite):
+class GameBoard(DirtySprite):
     def __init__(self, parent, idx):
         super().__init__()
         self.parent = parent
@@ -1721,6 +1775,8 @@ def build(event, scenes):
 #########################
 
 def snap(self, final_pos, final_size=None):
+    if isinstance(self, DirtySprite):  # a top-level sprite, the renderer also keeps its drawn_rects current
+        self.dirty = 1
     game_state.rects_to_draw.append(self.rect)
     final_width = final_size
     final_tile_size = self.tile_size * (final_width/self.rect.width) if final_size else None
@@ -1944,4 +2000,76 @@ def get_event_pos(event):
         except:
             pass
 
-    return None
\ No newline at end of file
+    return None
+
+def merge_dirty_rects(rects):
+    """
+    Few rects covering all of rects: the pair whose union adds the least area
+    beyond the two of them is merged, again and again, while that is under
+    DIRTY_RECT_COST pixels (or while there are more than MAX_DIRTY_RECTS).
+    So overlapping and nearby rects become one, far apart ones stay apart.
+    """
+    clusters = [pygame.Rect(rect) for rect in set(map(tuple, rects))]
+    clusters = [rect for rect in clusters if rect.w > 0 and rect.h > 0]
+    while len(clusters) > 1:
+        best_cost, best_i, best_j, best_union = None, 0, 0, None
+        for i, a in enumerate(clusters):
+            for j in range(i + 1, len(clusters)):
+                b = clusters[j]
+                union = a.union(b)
+                cost = union.w*union.h - a.w*a.h - b.w*b.h
+                if best_cost is None or cost < best_cost:
+                    best_cost, best_i, best_j, best_union = cost, i, j, union
+        if best_cost > DIRTY_RECT_COST and len(clusters) <= MAX_DIRTY_RECTS:
+            break
+        clusters[best_i] = best_union
+        del clusters[best_j]
+    return clusters
+
+
+def drawn_rect(sprite):
+    """
+    Rect covering everything sprite may draw: its rect, glow and shadow, and
+    the tiles, towers, texts and buttons it holds (tiles can be on their way
+    somewhere else on the screen).
+    """
+    rects = []
+    if getattr(sprite, "rect", None):
+        rects.append(sprite.rect)
+        if getattr(sprite, "border_radius", None) and hasattr(sprite, "cached_octagon"):
+            rects.append(sprite.rect.inflate(2*sprite.border_radius, 2*sprite.border_radius))  # UITextInput's border
+    for image_name, offset_name in (("rotated_glow", "glow_offset"), ("glow", "glow_offset"),
+                                    ("rotated_shadow", "shadow_offset")):
+        image = getattr(sprite, image_name, None)
+        if image is not None:
+            rects.append(image.get_rect(topleft=getattr(sprite, offset_name)))
+    for group_name in ("tiles", "towers", "texts", "buttons"):
+        for child in getattr(sprite, group_name, ()):
+            child_rect = drawn_rect(child)
+            if child_rect:
+                rects.append(child_rect)
+    return rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+
+
+def present_scene(scene_surface, rect):
+    """
+    Draw the dirty rect (scene coordinates) of scene_surface over the background
+    on the window, returns the window rect drawn. The scene is normally built
+    at the window's size, then the rect is blitted as is; otherwise only that
+    part of the scene is scaled, never the whole surface.
+    """
+    fullscreen = game_state.fullscreen
+    rect = rect.clip(scene_surface.get_rect())
+    if not rect:
+        return rect
+    (w, h), (full_w, full_h) = scene_surface.get_size(), fullscreen.get_size()
+    if (w, h) == (full_w, full_h):
+        fullscreen.blit(game_state.bg_image, rect.topleft, rect)
+        fullscreen.blit(scene_surface, rect.topleft, rect)
+        return rect
+    # whole window pixels covering the rect, so neighbouring rects leave no gaps
+    left, top = rect.left*full_w // w, rect.top*full_h // h
+    dest = pygame.Rect(left, top, -(-rect.right*full_w // w) - left, -(-rect.bottom*full_h // h) - top)
+    fullscreen.blit(game_state.bg_image, dest.topleft, dest)
+    fullscreen.blit(pygame.transform.scale(scene_surface.subsurface(rect), dest.size), dest.topleft)
+    return dest
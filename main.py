@@ -1,24 +1,31 @@
-import pygame
-from pygame.locals import *
-pygame.init()
-from globals2 import *
-from menu2 import *
-from settings2 import *
-from single_player2 import *
-from multiplayer2 import *
+import multiprocessing
+
+# CPU search workers may re-import this file (spawn start method, frozen exe),
+# so the window and scenes are only created by the real entry point
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
+    import pygame
+    from pygame.locals import *
+    pygame.init()
+    from globals2 import *
+    from menu2 import *
+    from settings2 import *
+    from single_player2 import *
+    from multiplayer2 import *
 
 
-# Initialize game
-pygame.display.set_caption("Flip7")
-clock = pygame.time.Clock()
+    # Initialize game
+    pygame.display.set_caption("Flip7")
+    clock = pygame.time.Clock()
 
-# Scene registry
-game_state.scenes = {
-    "menu": Menu(),
-    "settings": Settings()
-}
+    # Scene registry
+    game_state.scenes = {
+        "menu": Menu(),
+        "settings": Settings()
+    }
 
-switch_scene("menu")  # Start with the menu scene
+    switch_scene("menu")  # Start with the menu scene
 
 def main_loop():
     first_frame = True
@@ -37,6 +44,9 @@ def main_loop():
             elif event.type == VIDEORESIZE and sys.platform in ("win32", "cygwin"):
                 build(event, game_state.scenes)
                 game_state.get_background()
+            elif event.type in (WINDOWEXPOSED, VIDEOEXPOSE, APP_DIDENTERFOREGROUND):
+                # the window was uncovered or the app resumed (Android): what it showed is gone, repaint all of it
+                game_state.rects_to_draw.append(game_state.fullscreen.get_rect())
             else:
                 game_state.scenes[game_state.current_scene].handle_event(event)
 
@@ -45,19 +55,26 @@ def main_loop():
         current_scene.update(dt)
 
         # Draw
+        window_rects = []
         try:
-            rect_to_draw = game_state.rects_to_draw[0].unionall(game_state.rects_to_draw[1:])
-            #print(rect_to_draw)
-            game_state.fullscreen.blit(game_state.bg_image, rect_to_draw.topleft, rect_to_draw)
-            current_scene.draw(current_scene.screen)
-            scaled_current_scene = pygame.transform.scale(current_scene.screen, game_state.fullscreen.get_size())
-            game_state.fullscreen.blit(scaled_current_scene, rect_to_draw.topleft, rect_to_draw)
+            rects_to_draw = merge_dirty_rects(game_state.rects_to_draw)
+            for rect_to_draw in rects_to_draw:
+                # redraw the scene inside the cluster only
+                current_scene.screen.set_clip(rect_to_draw)
+                current_scene.draw(current_scene.screen)
+                window_rects.append(present_scene(current_scene.screen, rect_to_draw))
         except:
             pass
+        current_scene.screen.set_clip(None)
 
-        pygame.display.flip()
+        # Present: only what was drawn, nothing at all when the frame didn't change
+        if game_state.present_mode == "flip":
+            pygame.display.flip()
+        elif window_rects:
+            pygame.display.update(window_rects)
 
     pygame.quit()
+    get_search_pool().close()
 
 
 if __name__ == "__main__":
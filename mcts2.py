@@ -0,0 +1,500 @@
+# CPU player search (no pygame, so it can run in a worker process)
+import math, random, time
+from array import array
+from state2 import *
+from scoring2 import *
+from rollout2 import *
+from game2 import Game
+from cache2 import CACHE_SEED_VISITS
+from solver2 import *
+
+
+def get_legal_moves(state):
+    """
+    Return list of moves in canonical form:
+      (factory_idx, colour_idx, tile_count, tower_cat)
+    factory_idx: 0..len(factories)-1, pot index == len(factories)
+    tower_cat: 0..5 (0 is minus tower)
+    """
+    legal_moves = state.legal_moves()
+    lines = state.lines[state.player]
+
+    # prioritize by tile count (desc); prefer moves that fill a pattern line exactly
+    allowed = sorted(legal_moves, key=lambda x: x[2], reverse=True)
+    recommended = [m for m in allowed if m[3] != 0]  # prefer non-minus
+    if recommended:
+        # prefer moves that exactly fill the tower space (tower_cat - existing_len == len(tiles))
+        great = [m for m in recommended if (m[3] - lines[m[3] - 1][1]) == m[2]]
+        return great or recommended
+    return allowed
+
+
+# logit weights of move_priors, and progressive widening: a PUCT node may have
+# 1 + WIDEN_C * visits**WIDEN_ALPHA children
+PRIOR_TILE, PRIOR_LINE, PRIOR_EXACT, PRIOR_WASTE = 0.5, 1.0, 1.0, 0.75
+WIDEN_C, WIDEN_ALPHA = 1.0, 0.5
+
+
+def move_priors(state, moves):
+    """
+    Prior probability of each move, the get_legal_moves preferences made soft:
+    more tiles, onto a tower rather than the minus tower, filling a tower exactly,
+    and few tiles spilling onto the minus tower.
+    """
+    lines = state.lines[state.player]
+    logits = []
+    for source, colour, count, line in moves:
+        logit = PRIOR_TILE*count
+        if line:
+            space = line - lines[line - 1][1]
+            logit += PRIOR_LINE
+            if count == space:
+                logit += PRIOR_EXACT
+            elif count > space:
+                logit -= PRIOR_WASTE*(count - space)
+        else:
+            logit -= PRIOR_WASTE*count
+        logits.append(logit)
+    top = max(logits)
+    weights = [math.exp(logit - top) for logit in logits]
+    total = sum(weights)
+    return [weight/total for weight in weights]
+
+
+class Node:
+    """
+    Nodes hold no state: MCTS applies the moves on the path to one SearchState
+    on the way down and undoes them afterwards, so a node is only its statistics.
+    moves: legal moves of this node as encode_move codes, generated on first
+           visit; children[i] is the node reached by moves[i], next_move is the
+           first one not expanded yet
+    priors: with PUCT selection, move_priors of moves (sorted highest first)
+    key: Zobrist key of the node's position
+    seed_visits, seed_wins: the part of visits and wins taken from the evaluation cache
+    Positions reached by different move orders share one Node through the
+    MCTS transposition table.
+    """
+    __slots__ = ("key", "children", "visits", "wins", "moves", "next_move", "priors", "seed_visits", "seed_wins")
+
+    def __init__(self, key=None):
+        self.key = key
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.moves = None
+        self.next_move = 0
+        self.priors = None
+        self.seed_visits = 0
+        self.seed_wins = 0.0
+
+    def legal_moves(self, state):
+        """state: the position of this node (only read the first time)."""
+        if self.moves is None:
+            self.moves = array("H", [encode_move(source, colour, line)
+                                     for source, colour, _, line in get_legal_moves(state)])
+        return self.moves
+
+    def is_fully_expanded(self, state):
+        return self.next_move == len(self.legal_moves(state))
+
+
+class SearchBudget:
+    """
+    How long one search may run: ms of wall-clock time, iterations and/or new
+    tree nodes. None means no limit, the search stops at the first limit reached.
+    """
+    def __init__(self, ms=None, iterations=None, nodes=None):
+        self.ms = ms
+        self.iterations = iterations
+        self.nodes = nodes
+
+
+# budget per difficulty, for each root-parallel worker
+SEARCH_BUDGETS = {
+    "easy": SearchBudget(ms=300, iterations=2000),
+    "hard": SearchBudget(ms=2000, nodes=150000),
+}
+ROLLOUT_BATCH = 64  # rollouts per leaf when NumPy is available (hard only, easy doesn't roll out)
+EVAL_VERSION = 1  # bump when get_reward, the rollouts or the selection change: it salts the evaluation cache
+
+
+class SearchStats:
+    """
+    Where an instrumented MCTS spends its time: calls and seconds per phase,
+    depth of the selected leaves, children of the nodes selected through, and
+    nodes allocated. Plain numbers, so it can be sent from a worker process.
+    """
+    PHASES = ("select", "expand", "simulate", "reward", "backpropagate")
+
+    def __init__(self):
+        self.calls = dict.fromkeys(self.PHASES, 0)
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.depth_total = 0
+        self.max_depth = 0
+        self.branching_total = 0
+        self.inner_nodes = 0
+        self.nodes = 0
+
+    def timed(self, phase, function):
+        """function, counting its calls and time under phase."""
+        calls, seconds = self.calls, self.seconds
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            start = perf_counter()
+            result = function(*args)
+            seconds[phase] += perf_counter() - start
+            calls[phase] += 1
+            return result
+        return wrapper
+
+    def add_path(self, nodes):
+        """Tree shape of one selection: nodes from the root down to the selected leaf."""
+        depth = len(nodes) - 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+        self.branching_total += sum(len(node.children) for node in nodes[:-1])
+        self.inner_nodes += depth
+
+    def lines(self):
+        """Human readable summary, one line per phase and one for the tree."""
+        total = sum(self.seconds.values()) or 1
+        lines = [f"{phase:13} {self.calls[phase]:7} calls {1000*self.seconds[phase]:8.1f} ms "
+                 f"{100*self.seconds[phase]/total:3.0f}%" for phase in self.PHASES]
+        selections = self.calls["select"] or 1
+        lines.append(f"depth {self.depth_total/selections:.1f} (max {self.max_depth}) "
+                     f"branching {self.branching_total/(self.inner_nodes or 1):.1f} nodes {self.nodes}")
+        return lines
+
+
+class MCTS:
+    """
+    selection: "uct" expands every move get_legal_moves keeps, in its order;
+    "puct" considers all legal moves, weighs them by move_priors and only
+    widens a node to more of them as it gets visited.
+    lookahead: hard leaves are valued over this many determinisations of the
+    next round (see _lookahead), 0 to stop at the end of the round. Needs NumPy.
+    cache: EvalCache of earlier searches with the same settings; new nodes
+    found in it start with (some of) its visits and value.
+    solve_below: positions with at most this many tile groups left are
+    solved exactly (see EndgameSolver) instead of searched, 0 never.
+    stats: collect SearchStats in self.stats. The phases are only wrapped on
+    this instance then, so an MCTS without stats runs the plain methods.
+    """
+    reward = staticmethod(get_reward)  # looked up on the instance so stats can time it
+
+    def __init__(self, iterations=1000, c_param=1.4, table_size=200000, difficulty="easy", seed=None,
+                 batch_size=0, selection="uct", lookahead=0, cache=None, solve_below=0,
+                 stats=False):
+        self.iterations = iterations
+        self.c = c_param
+        self.difficulty = difficulty
+        self.selection = selection
+        # range of the rewards seen, PUCT scales the average rewards to [0, 1] with it
+        self.low = math.inf
+        self.high = -math.inf
+        self.rng = random.Random(seed)  # root-parallel workers each get their own seed
+        # leaves are evaluated by batch_size rollouts at once when NumPy is there
+        self.batch = BatchRollout(batch_size, self.rng.getrandbits(32)) if batch_size and np is not None else None
+        self.lookahead = BatchRollout(lookahead, self.rng.getrandbits(32)) if lookahead and np is not None else None
+        # transposition table: Zobrist key -> Node, stops growing once full
+        self.table = {}
+        self.table_size = table_size
+        self.cache = cache
+        self.solve_below = solve_below
+        self.solver = EndgameSolver() if solve_below else None
+        # budget of the current search and what has been spent of it, see start_budget()
+        self.budget = SearchBudget(iterations=iterations)
+        self.start_time = time.perf_counter()
+        self.iterations_done = 0
+        self.nodes_done = 0
+        self.stats = None
+        if stats:
+            self._instrument()
+
+    def _instrument(self):
+        self.stats = stats = SearchStats()
+        for phase in SearchStats.PHASES:
+            name = phase if phase == "reward" else "_" + phase
+            setattr(self, name, stats.timed(phase, getattr(self, name)))
+        select, expand = self._select, self._expand
+
+        def select_with_shape(node, state, path, nodes):
+            leaf = select(node, state, path, nodes)
+            stats.add_path(nodes)
+            return leaf
+
+        def expand_counting_nodes(node, state, path, nodes, player):
+            nodes_done = self.nodes_done
+            child = expand(node, state, path, nodes, player)
+            stats.nodes += self.nodes_done - nodes_done
+            return child
+        self._select, self._expand = select_with_shape, expand_counting_nodes
+
+    def start_budget(self, budget):
+        """Start spending budget; iterate() can be called until budget_left() is False."""
+        self.budget = budget
+        self.start_time = time.perf_counter()
+        self.iterations_done = 0
+        self.nodes_done = 0
+
+    def budget_left(self):
+        budget = self.budget
+        if budget.iterations is not None and self.iterations_done >= budget.iterations:
+            return False
+        if budget.nodes is not None and self.nodes_done >= budget.nodes:
+            return False
+        if budget.ms is not None and (time.perf_counter() - self.start_time)*1000 >= budget.ms:
+            return False
+        return True
+
+    def search(self, root, state, player, budget=None):
+        """
+        root: Node already constructed
+        state: SearchState of the root (left unchanged)
+        player: UI player index (1-based) of the CPU (so convert when indexing)
+        budget: SearchBudget, by default self.iterations iterations
+        The search is anytime: best_move(root) can be asked for between iterations.
+        """
+        move = self.solved_move(state)
+        if move is not None:
+            return move
+        self.start_budget(budget or SearchBudget(iterations=self.iterations))
+        while self.budget_left():
+            self.iterate(root, state, player)
+
+        return self.best_move(root, state)
+
+    def solved_move(self, state):
+        """Best move by EndgameSolver when state is close enough to the end of the round, otherwise None."""
+        if self.solver is None or state.is_terminal() or remaining_groups(state) > self.solve_below:
+            return None
+        return self.solver.best_move(state)[0]
+
+    def iterate(self, root, state, player):
+        """Run one select/expand/simulate/backpropagate pass and return its reward."""
+        self.iterations_done += 1
+        path = []  # moves applied to state, undone at the end
+        nodes = [root]  # nodes visited, a shared node has several parents
+        node = self._select(root, state, path, nodes)
+        if not state.is_terminal():
+            node = self._expand(node, state, path, nodes, player)
+        reward = self._simulate(state, player)
+        self.low = min(self.low, reward)
+        self.high = max(self.high, reward)
+        self._backpropagate(nodes, reward)
+        for move in reversed(path):
+            state.undo(move)
+        return reward
+
+    def _uct(self, parent, child):
+        if child.visits == 0:
+            return float("inf")
+        return (child.wins / child.visits) + self.c * math.sqrt(math.log(parent.visits + 1) / child.visits)
+
+    def _puct(self, parent, idx):
+        child = parent.children[idx]
+        if child.visits == 0:
+            value = 0.5
+        else:
+            spread = self.high - self.low
+            value = (child.wins/child.visits - self.low)/spread if spread > 0 else 0.5
+        return value + self.c * parent.priors[idx] * math.sqrt(parent.visits) / (1 + child.visits)
+
+    def _expandable(self, node, state):
+        """True if _expand should add a child to node rather than _select descend through it."""
+        if self.selection != "puct":
+            return not node.is_fully_expanded(state)
+        if node.moves is None:
+            moves = state.legal_moves()
+            priors = move_priors(state, moves)
+            order = sorted(range(len(moves)), key=lambda i: -priors[i])
+            node.moves = array("H", [encode_move(moves[i][0], moves[i][1], moves[i][3]) for i in order])
+            node.priors = array("f", [priors[i] for i in order])
+        # progressive widening
+        return node.next_move < min(len(node.moves), 1 + int(WIDEN_C * node.visits ** WIDEN_ALPHA))
+
+    def _select(self, node, state, path, nodes):
+        while node.children and not self._expandable(node, state):
+            parent = node
+            if self.selection == "puct":
+                idx = max(range(len(parent.children)), key=lambda i: self._puct(parent, i))
+            else:
+                idx = max(range(len(parent.children)), key=lambda i: self._uct(parent, parent.children[i]))
+            node = parent.children[idx]
+            move = state.decode_move(parent.moves[idx])
+            state.apply(move)
+            path.append(move)
+            nodes.append(node)
+        return node
+
+    def _expand(self, node, state, path, nodes, player):
+        if not self._expandable(node, state):
+            return node
+        move = state.decode_move(node.moves[node.next_move])
+        node.next_move += 1
+        state.apply(move)
+        path.append(move)
+        child_node = self.table.get(state.key)
+        if child_node is None:
+            child_node = Node(state.key)
+            self.nodes_done += 1
+            cached = self.cache.lookup(state.key, player - 1) if self.cache is not None else None
+            if cached is not None:
+                visits, value, _ = cached
+                child_node.visits = child_node.seed_visits = min(visits, CACHE_SEED_VISITS)
+                child_node.wins = child_node.seed_wins = value * child_node.visits
+                self.low = min(self.low, value)
+                self.high = max(self.high, value)
+            if len(self.table) < self.table_size:
+                self.table[state.key] = child_node
+        node.children.append(child_node)
+        nodes.append(child_node)
+        return child_node
+
+    def _simulate(self, state, ui_player_idx):
+        if self.lookahead is not None and self.difficulty == "hard":
+            return self._lookahead(state, ui_player_idx - 1)
+        certain_rewards = self.reward(state)
+        if self.batch is not None and self.difficulty == "hard":
+            self.batch.play_out(state, hard=True)
+            return self.batch.mean_value(certain_rewards, ui_player_idx - 1)
+        # random/simplified rollout: pick a most preferred legal move each step to keep speed.
+        # Ties are broken at random so that root-parallel workers explore different lines.
+        rollout = []
+        while not state.is_terminal():
+            legal = get_legal_moves(state)
+            if self.difficulty == "hard":
+                ties = 1
+                while ties < len(legal) and legal[ties][2] == legal[0][2]:
+                    ties += 1
+                mv = legal[self.rng.randrange(ties)]
+            else:
+                mv = self.rng.choice(legal)
+            state.apply(mv)
+            rollout.append(mv)
+        potential_rewards = self.reward(state)
+        for mv in reversed(rollout):
+            state.undo(mv)
+        cpu_idx0 = (ui_player_idx - 1)  # convert UI 1-based to 0-based state index
+        if self.difficulty == "easy":
+            rewards = [certain_rewards[i] for i in range(len(certain_rewards))]
+            return rewards[cpu_idx0]
+        else:
+            rewards = [certain_rewards[i] + potential_rewards[i] for i in range(len(certain_rewards))]
+            # return CPU's score minus average of opponents who are competitive
+            own = rewards[cpu_idx0]
+            others = [rewards[i] for i in range(len(rewards)) if i != cpu_idx0 and rewards[i] > own * 0.9]
+            if others:
+                return own - (sum(others) / len(others))
+            else:  # if no close opponents, compare to average of all others
+                other_all = [rewards[i] for i in range(len(rewards)) if i != cpu_idx0]
+                if other_all:
+                    return own - (sum(other_all) / len(other_all))
+                return own
+
+    def _lookahead(self, state, player):
+        """
+        Value of a leaf one round further on. Its round is rolled out once per
+        determinisation in a batch; each result is scored with the game rules
+        (end-game bonuses included when the game ends) and the factories are
+        refilled from its own sample of the bag. The next rounds are then played
+        out in a second batch and valued like get_reward. player is 0-based.
+        The round's points are those of round_scores: the real scores aren't in
+        the state, so the floor at 0 points would swallow the minus tower penalties.
+        """
+        batch = self.lookahead
+        batch.play_out(state, hard=True)
+        scores = np.zeros((batch.size, state.num_players))
+        going_on = np.ones(batch.size, dtype=bool)
+        next_states = []
+        for b in range(batch.size):
+            round_end = batch.state(b)
+            round_end.bag = state.bag
+            game = Game.from_search_state(round_end, self.rng)
+            points = round_scores(round_end)
+            game.score_round()
+            game.scores = points
+            if game.is_game_over():
+                game.score_end_game()
+                going_on[b] = False  # its empty factories end the next play out straight away
+            else:
+                game.start_round()
+            scores[b] = game.scores
+            next_states.append(game.state)
+        batch.play_out_all(next_states, hard=True)
+        scores[going_on] += batch.rewards()[going_on]
+        return hard_values(scores, player).mean()
+
+    def _backpropagate(self, nodes, value):
+        for node in nodes:
+            node.visits += 1
+            node.wins += value
+
+    def _uct_select(self, node):
+        def uct(child):
+            if child.visits == 0:
+                return float("inf")
+            return (child.wins / child.visits) + 2 * math.sqrt(2 * math.log(node.visits) / child.visits)
+        return max(node.children, key=uct)
+
+    def _get_best_move(self, node):
+        if not node.children:
+            raise ValueError("No children to select the best move from.")
+        return max(node.children, key=lambda child: child.visits)
+
+    def best_move(self, node, state):
+        """Move from node (whose position is state) to its most visited child."""
+        return state.decode_move(node.moves[node.children.index(self._get_best_move(node))])
+
+    def advance_root(self, root, state, new_state):
+        """
+        Find the node of new_state below root (state is root's position and is
+        left unchanged), following the moves played since. The transposition
+        table is trimmed to the nodes under the new root. Returns None when the
+        position is not in the tree.
+        """
+        if state.key == new_state.key:
+            return root
+        if not state.precedes(new_state):
+            return None
+        new_root = self._find(root, state, new_state, state.num_players)
+        if new_root is not None:
+            # positions that are not under the new root can't come up again this round
+            self.table = {}
+            stack = [new_root]
+            while stack and len(self.table) < self.table_size:
+                node = stack.pop()
+                if node.key not in self.table:
+                    self.table[node.key] = node
+                    stack.extend(node.children)
+        return new_root
+
+    def _find(self, node, state, target, depth):
+        for code, child in zip(node.moves or [], node.children):
+            move = state.decode_move(code)
+            state.apply(move)
+            if state.key == target.key:
+                found = child
+            elif depth > 1 and state.precedes(target):
+                found = self._find(child, state, target, depth - 1)
+            else:
+                found = None
+            state.undo(move)
+            if found is not None:
+                return found
+        return None
+
+    def root_visits(self, root, state):
+        """Visit count of every expanded move of root (position state), for merging root-parallel trees."""
+        return {state.decode_move(code): child.visits for code, child in zip(root.moves or [], root.children)}
+
+
+def merge_root_visits(all_root_visits):
+    """Sum the root visit counts of independent trees; returns (visits by move, most visited move)."""
+    merged = {}
+    for root_visits in all_root_visits:
+        for move, visits in root_visits.items():
+            merged[move] = merged.get(move, 0) + visits
+    best_move = max(merged, key=merged.get) if merged else None
+    return merged, best_move
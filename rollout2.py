@@ -0,0 +1,193 @@
+# Batched rollouts: many copies of a leaf position played out in lockstep with NumPy.
+# NumPy is optional (it is not in the Android build), MCTS falls back to one rollout at a time.
+from state2 import *
+from scoring2 import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NEIGHBOURS_ARRAY = np.array(NEIGHBOURS) if np is not None else None
+
+
+class BatchRollout:
+    """
+    Plays size copies of a SearchState (or size different ones) to the end of
+    the round at once, with the same policy as MCTS._simulate, and scores the
+    results like get_reward.
+    Per copy: sources[b] holds the factories followed by the pot (colour counts),
+    walls[b][player], line_colours/line_counts[b][player][row], floors[b][player],
+    pot_one[b], player[b], first_player[b].
+    """
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.shape = None  # (players, factories) the move tables below were built for
+
+    def _build_moves(self, num_players, num_factories):
+        # every (source, colour, line) a move can have, flattened
+        sources = num_factories + 1
+        self.move_sources = np.repeat(np.arange(sources), 30)
+        self.move_colours = np.tile(np.repeat(np.arange(5), 6), sources)
+        self.move_lines = np.tile(np.arange(6), sources*5)
+        self.on_line = self.move_lines > 0
+        self.move_rows = np.maximum(self.move_lines - 1, 0)
+        self.shape = (num_players, num_factories)
+
+    def _load(self, states):
+        """One state for all copies, or one per copy."""
+        num_players, num_factories = states[0].num_players, len(states[0].factories)
+        if self.shape != (num_players, num_factories):
+            self._build_moves(num_players, num_factories)
+        repeat = self.size // len(states)
+        def load(values, dtype):
+            return np.repeat(np.array(values, dtype=dtype), repeat, axis=0)
+        self.sources = load([state.factories + [state.pot] for state in states], np.int16)
+        lines = load([state.lines for state in states], np.int16)
+        self.line_colours = lines[..., 0].copy()
+        self.line_counts = lines[..., 1].copy()
+        self.floors = load([state.floors for state in states], np.int16)
+        self.pot_one = load([state.pot_one for state in states], bool)
+        self.player = load([state.player for state in states], np.int64)
+        self.first_player = load([state.first_player for state in states], np.int64)
+        self.walls = load([state.walls for state in states], np.int64)
+        # wall_free[b][player][move]: the wall square of the move's line and colour is still free
+        wall_bits = np.array(WALL_BITS, dtype=np.int64)[self.move_rows, self.move_colours]
+        self.wall_free = self.walls[..., None] & wall_bits == 0
+
+    def state(self, b):
+        """SearchState of copy b."""
+        lines = [[(int(colour), int(count)) if count else (-1, 0) for colour, count in zip(colours, counts)]
+                 for colours, counts in zip(self.line_colours[b], self.line_counts[b])]
+        return SearchState([int(wall) for wall in self.walls[b]], lines, [int(floor) for floor in self.floors[b]],
+                           [tuple(int(count) for count in factory) for factory in self.sources[b, :-1]],
+                           [int(count) for count in self.sources[b, -1]], bool(self.pot_one[b]),
+                           int(self.player[b]), first_player=int(self.first_player[b]))
+
+    def _step(self, rows, hard):
+        """Choose and play one move for each copy in rows (those with tiles left)."""
+        count = rows.size
+        players = self.player[rows]
+        tiles = self.sources[rows][:, self.move_sources, self.move_colours]
+        line_colours = self.line_colours[rows, players][:, self.move_rows]
+        line_counts = self.line_counts[rows, players][:, self.move_rows]
+
+        # legal moves, then the preferences of get_legal_moves
+        fits = np.where(line_colours == -1, self.wall_free[rows, players],
+                        (line_colours == self.move_colours) & (line_counts < self.move_lines))
+        legal = (tiles > 0) & (~self.on_line | fits)
+        recommended = legal & self.on_line
+        great = recommended & (self.move_lines - line_counts == tiles)
+        choice = np.where(great.any(1)[:, None], great,
+                          np.where(recommended.any(1)[:, None], recommended, legal))
+        if hard:
+            # only the moves taking the most tiles
+            most = np.where(choice, tiles, 0).max(1)
+            choice &= tiles == most[:, None]
+        noise = self.rng.random(choice.shape)
+        noise[~choice] = -1
+        moves = noise.argmax(1)
+
+        # play the chosen moves
+        everyone = np.arange(count)
+        source = self.move_sources[moves]
+        colour = self.move_colours[moves]
+        line = self.move_lines[moves]
+        taken = tiles[everyone, moves]
+        pot = len(self.sources[0]) - 1
+        floors = self.floors[rows, players]
+
+        from_pot = source == pot
+        pot_rows = rows[from_pot]
+        floors[from_pot] += self.pot_one[pot_rows]
+        takes_one = pot_rows[self.pot_one[pot_rows]]
+        self.first_player[takes_one] = self.player[takes_one]
+        self.pot_one[pot_rows] = False
+        self.sources[pot_rows, pot, colour[from_pot]] = 0
+        # leftovers of the factory go to the pot
+        factory_rows, factory = rows[~from_pot], source[~from_pot]
+        leftovers = self.sources[factory_rows, factory]
+        leftovers[np.arange(factory_rows.size), colour[~from_pot]] = 0
+        self.sources[factory_rows, pot] += leftovers
+        self.sources[factory_rows, factory] = 0
+
+        # fill the tower, anything that does not fit goes to the minus tower
+        row = self.move_rows[moves]
+        on_line = line > 0
+        line_counts = self.line_counts[rows, players, row]
+        placed = np.where(on_line, np.minimum(taken, line - line_counts), 0)
+        line_rows = rows[on_line]
+        self.line_colours[line_rows, players[on_line], row[on_line]] = colour[on_line]
+        self.line_counts[line_rows, players[on_line], row[on_line]] += placed[on_line]
+        self.floors[rows, players] = np.minimum(FLOOR_SIZE, floors + taken - placed)
+        self.player[rows] = (players + 1) % self.walls.shape[1]
+
+    def play_out(self, state, hard):
+        """Load size copies of state and play them all to the end of the round."""
+        self.play_out_all([state], hard)
+
+    def play_out_all(self, states, hard):
+        """Load one copy of each of states (exactly size of them) and play them all to the end of the round."""
+        self._load(states)
+        rows = np.nonzero(self.sources.any(axis=(1, 2)))[0]
+        while rows.size:
+            self._step(rows, hard)
+            rows = rows[self.sources[rows].any(axis=(1, 2))]
+
+    def rewards(self):
+        """get_reward of every copy, as an array of shape (size, players)."""
+        size, num_players = self.walls.shape
+        scores = np.zeros((size, num_players))
+        for i in range(num_players):
+            wall = self.walls[:, i]
+            test_wall = wall.copy()
+
+            # tile/tower scoring
+            for row in range(5):
+                colour = self.line_colours[:, i, row]
+                full = self.line_counts[:, i, row] == row + 1
+                col = (colour.astype(np.int64) - row) % 5
+                test_wall |= np.where(full, np.left_shift(1, row*5 + col), 0)
+                scores[:, i] += np.where(full, tile_scores(test_wall, row, col) + row, -(row + 1)/3)
+
+            # row bonuses
+            for row_mask in ROW_MASKS:
+                full = wall & row_mask == row_mask
+                scores[:, i] += np.where(full, 2, 0)
+                # incentive to be ahead if you've finished a row (small)
+                scores[:, i] += np.where(full & (scores[:, i] == scores.max(1)), 5, 0)
+
+            # column and colour bonuses
+            for col_mask in COL_MASKS:
+                scores[:, i] += np.where(wall & col_mask == col_mask, 7, 0)
+            for colour_mask in COLOUR_MASKS:
+                scores[:, i] += np.where(wall & colour_mask == colour_mask, 10, 0)
+
+            # minus tower penalties
+            scores[:, i] += np.array(FLOOR_PENALTIES)[self.floors[:, i]]
+        return scores
+
+    def mean_value(self, certain_rewards, player):
+        """
+        Average over the copies of the hard reward of MCTS._simulate: player's
+        (0-based) score minus the average of the opponents close to it.
+        """
+        return hard_values(np.array(certain_rewards) + self.rewards(), player).mean()
+
+
+def hard_values(rewards, player):
+    """The hard reward of MCTS._simulate for each row of a (copies, players) array of rewards."""
+    own = rewards[:, player]
+    others = np.delete(rewards, player, axis=1)
+    if not others.shape[1]:
+        return own
+    close = others > own[:, None]*0.9
+    close_count = close.sum(1)
+    close_mean = np.where(close, others, 0).sum(1) / np.maximum(close_count, 1)
+    return own - np.where(close_count > 0, close_mean, others.mean(1))
+
+
+def tile_scores(walls, row, cols):
+    """calculate_tile_score for an array of walls, each with its own column on row."""
+    return (1 + NEIGHBOURS_ARRAY[walls >> row*5 & ROW_MASK, cols]
+            + NEIGHBOURS_ARRAY[column_bits(walls, cols), row])
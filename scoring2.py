@@ -0,0 +1,93 @@
+# Table-driven scoring for the CPU search (no pygame): everything is looked up or mask tested
+from state2 import *
+
+# WALL_COLS[row][colour] is the wall column of colour on that row
+WALL_COLS = [[wall_col(row, colour) for colour in range(5)] for row in range(5)]
+ROW_MASKS = [ROW_MASK << row*5 for row in range(5)]
+COL_MASKS = [COL_MASK << col for col in range(5)]
+FLOOR_PENALTIES = [0, -1, -2, -4, -6, -8, -11, -14]  # by number of tiles on the minus tower
+
+
+def _neighbours(occupancy, pos):
+    """Tiles joined to pos in a 5-bit row or column occupancy (pos itself not counted)."""
+    count = 0
+    for step in (-1, 1):
+        other = pos + step
+        while 0 <= other < 5 and occupancy >> other & 1:
+            count += 1
+            other += step
+    return count
+
+
+# NEIGHBOURS[occupancy][pos], for the row or the column through a tile
+NEIGHBOURS = [[_neighbours(occupancy, pos) for pos in range(5)] for occupancy in range(32)]
+
+# multiplying the column bits (0, 5, 10, 15, 20 after shifting) by this moves
+# bit 5*row to bit 20+row without any two products overlapping
+COLUMN_GATHER = sum(1 << 4*i for i in range(1, 6))
+
+
+def column_bits(wall, col):
+    """
+    Occupancy of a wall column as a 5-bit number, bit row set when (row, col)
+    is tiled. Works on NumPy arrays of walls and columns as well.
+    """
+    return ((wall >> col & COL_MASK) * COLUMN_GATHER >> 20) & ROW_MASK
+
+
+def calculate_tile_score(wall, row, col):
+    """Score contribution for placing a tile at (row,col) on a wall bitmask."""
+    return 1 + NEIGHBOURS[wall >> row*5 & ROW_MASK][col] + NEIGHBOURS[column_bits(wall, col)][row]
+
+
+def placement_score(wall, row, colour):
+    """
+    Points for moving a full tower of colour on row onto wall, as the game
+    scores it: the tiles joined to it along the row and along the column,
+    counting it in both only when it is joined both ways.
+    """
+    col = WALL_COLS[row][colour]
+    wall |= WALL_BITS[row][colour]
+    horizontal = 1 + NEIGHBOURS[wall >> row*5 & ROW_MASK][col]
+    vertical = 1 + NEIGHBOURS[column_bits(wall, col)][row]
+    return horizontal + vertical - 1 if horizontal == 1 or vertical == 1 else horizontal + vertical
+
+
+def get_reward(state):
+    """
+    Return list of scores (one per player) for this state's heuristic.
+    Uses tile/tower scoring, row/col/colour bonuses, minus penalties.
+    """
+    scores = [0] * len(state.walls)
+    for i, wall in enumerate(state.walls):
+        score = 0
+        test_wall = wall
+
+        # tile/tower scoring
+        for row, (colour, count) in enumerate(state.lines[i]):
+            if count == row + 1:
+                test_wall |= WALL_BITS[row][colour]
+                score += row + calculate_tile_score(test_wall, row, WALL_COLS[row][colour])
+            else:
+                score -= (row + 1)/3
+
+        # row bonuses
+        for row_mask in ROW_MASKS:
+            if wall & row_mask == row_mask:
+                score += 2
+                # incentive to be ahead if you've finished a row (small)
+                scores[i] = score
+                if score == max(scores):
+                    score += 5
+
+        # column and colour bonuses
+        for col_mask in COL_MASKS:
+            if wall & col_mask == col_mask:
+                score += 7
+        for colour_mask in COLOUR_MASKS:
+            if wall & colour_mask == colour_mask:
+                score += 10
+
+        # minus tower penalties
+        scores[i] = score + FLOOR_PENALTIES[state.floors[i]]
+    return scores
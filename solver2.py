@@ -0,0 +1,79 @@
+# Exact endgame solver for the last picks of a round: max-n over every legal move, memoised by Zobrist key
+from state2 import *
+from scoring2 import *
+
+SOLVE_GROUPS = 4  # solve positions with at most this many tile groups left to pick (0 never solves)
+SOLVER_TABLE_SIZE = 500000  # memoised positions kept, the table is emptied when it gets bigger
+
+
+def remaining_groups(state):
+    """Tile groups (one colour in one factory or the pot) left to pick; every pick takes at least one."""
+    return (sum(1 for factory in state.factories for count in factory if count)
+            + sum(1 for count in state.pot if count))
+
+
+def round_scores(state):
+    """
+    Points each player gets when the round in state is scored: full towers
+    go onto the wall as in Game.score_round, then the minus tower penalty
+    (without the floor at 0 points, as the scores aren't in the state).
+    """
+    scores = []
+    for player, wall in enumerate(state.walls):
+        score = FLOOR_PENALTIES[state.floors[player]]
+        for row, (colour, count) in enumerate(state.lines[player]):
+            if count != row + 1:
+                continue
+            score += placement_score(wall, row, colour)
+            wall |= WALL_BITS[row][colour]
+        scores.append(score)
+    return scores
+
+
+class EndgameSolver:
+    """
+    Every player maximises its own round score minus the average of the
+    others' (max-n; with two players that is plain minimax). Values of the
+    positions solved are memoised by key, so transpositions and later calls
+    in the same round are lookups.
+    """
+    def __init__(self):
+        self.table = {}
+
+    def values(self, state):
+        """Per player value of state with best play by everyone to the end of the round."""
+        values = self.table.get(state.key)
+        if values is not None:
+            return values
+        if state.is_terminal():
+            scores = round_scores(state)
+            total = sum(scores)
+            others = len(scores) - 1
+            values = tuple(score - (total - score)/others for score in scores)
+        else:
+            player = state.player
+            for move in state.legal_moves():
+                state.apply(move)
+                child = self.values(state)
+                state.undo(move)
+                if values is None or child[player] > values[player]:
+                    values = child
+        if len(self.table) >= SOLVER_TABLE_SIZE:
+            self.table = {}
+        self.table[state.key] = values
+        return values
+
+    def best_move(self, state):
+        """
+        Provably best move of the player to move, and its value for them. Of
+        equally good moves the one placing the most tiles on a tower is taken.
+        """
+        player = state.player
+        best, best_value = None, None
+        for move in sorted(state.legal_moves(), key=lambda move: (move[3] == 0, -move[2])):
+            state.apply(move)
+            value = self.values(state)[player]
+            state.undo(move)
+            if best is None or value > best_value:
+                best, best_value = move, value
+        return best, best_value
@@ -0,0 +1,245 @@
+# Compact game state for the CPU search (no pygame, so it can be used anywhere)
+import random
+
+COLOURS = ["purple", "green", "red", "yellow", "blue"]  # same order as GameBoard.tile_colours
+COLOUR_IDX = {colour: i for i, colour in enumerate(COLOURS)}
+FLOOR_SIZE = 7  # tiles that fit on the minus tower
+EMPTY_FACTORY = (0, 0, 0, 0, 0)
+
+
+def wall_col(row, colour):
+    """Column of colour on a wall row (each row is the colour order shifted by one)."""
+    return (colour - row) % 5
+
+
+def encode_move(source, colour, line):
+    """Small int for a move (below 300), its count is left out as the position gives it."""
+    return (source*5 + colour)*6 + line
+
+
+# WALL_BITS[row][colour] is the wall square that colour goes to on that row
+WALL_BITS = [[1 << (row*5 + wall_col(row, colour)) for colour in range(5)] for row in range(5)]
+ROW_MASK = 0b11111
+COL_MASK = 0b100001000010000100001
+COLOUR_MASKS = [sum(WALL_BITS[row][colour] for row in range(5)) for colour in range(5)]
+
+# Zobrist keys, seeded so every process (and every session) hashes positions the same way.
+# A count of 0 has key 0 so empty towers/factories/pot colours add nothing to the hash.
+MAX_PLAYERS = 4
+MAX_FACTORIES = 2*MAX_PLAYERS + 1
+_keys = random.Random(2017)
+def _zobrist(size):
+    return [0] + [_keys.getrandbits(64) for _ in range(size - 1)]
+WALL_KEYS = [[_keys.getrandbits(64) for _ in range(25)] for _ in range(MAX_PLAYERS)]
+LINE_KEYS = [[[_zobrist(row + 2) for _ in range(5)] for row in range(5)] for _ in range(MAX_PLAYERS)]
+FLOOR_KEYS = [_zobrist(FLOOR_SIZE + 1) for _ in range(MAX_PLAYERS)]
+FACTORY_KEYS = [[_zobrist(5) for _ in range(5)] for _ in range(MAX_FACTORIES)]
+POT_KEYS = [_zobrist(21) for _ in range(5)]  # 20 tiles of each colour
+POT_ONE_KEY = _keys.getrandbits(64)
+PLAYER_KEYS = [_keys.getrandbits(64) for _ in range(MAX_PLAYERS)]
+FIRST_PLAYER_KEYS = [_keys.getrandbits(64) for _ in range(MAX_PLAYERS)]
+
+
+class SearchState:
+    """
+    walls: per player 25-bit mask, bit row*5+col is set when that wall square is tiled
+    lines: per player list of 5 (colour, count) pairs, colour -1 when the tower is empty
+    floors: per player number of tiles on the minus tower (including the 'one' tile)
+    factories: per factory tuple of 5 colour counts
+    pot: list of 5 colour counts, pot_one: 'one' tile still in the pot
+    player: index (0-based) of the player to move
+    first_player: player who took the 'one' tile this round (starts the next one), -1 if it is still in the pot
+    bag: colour counts left in the bag, None when unknown (only used to look past the end of the round)
+    history: undo records pushed by apply() and popped by undo()
+    key: Zobrist hash of the position, kept up to date by apply() and undo()
+    """
+    __slots__ = ("walls", "lines", "floors", "factories", "pot", "pot_one", "player", "first_player", "bag",
+                 "history", "key")
+
+    def __init__(self, walls, lines, floors, factories, pot, pot_one, player, key=None, first_player=-1, bag=None):
+        self.walls = walls
+        self.lines = lines
+        self.floors = floors
+        self.factories = factories
+        self.pot = pot
+        self.pot_one = pot_one
+        self.player = player
+        self.first_player = first_player
+        self.bag = bag
+        self.history = []
+        self.key = self.compute_key() if key is None else key
+
+    @classmethod
+    def from_nice_state(cls, state, player):
+        """Build from the dict made by make_nice_state; player is the 0-based player to move."""
+        walls, lines, floors = [], [], []
+        first_player = -1
+        for i, (game_board, towers) in enumerate(zip(state["Gameboards"], state["Towers"])):
+            wall = 0
+            for row, wall_row in enumerate(game_board):
+                for col, colour in enumerate(wall_row):
+                    if colour != "-":
+                        wall |= 1 << (row*5 + col)
+            walls.append(wall)
+            lines.append([(COLOUR_IDX[tower[0]], len(tower)) if tower else (-1, 0) for tower in towers[1:]])
+            floors.append(len(towers[0]))
+            if "one" in towers[0]:
+                first_player = i
+        factories = [tuple(factory.count(colour) for colour in COLOURS) for factory in state["Factories"]]
+        pot = [state["Pot"].count(colour) for colour in COLOURS]
+        bag = tuple(state["Bag"].count(colour) for colour in COLOURS) if "Bag" in state else None
+        return cls(walls, lines, floors, factories, pot, "one" in state["Pot"], player,
+                   first_player=first_player, bag=bag)
+
+    def copy(self):
+        # factories and line entries are tuples, so only the outer lists need copying.
+        # The copy starts with an empty history.
+        return SearchState(self.walls[:], [lines[:] for lines in self.lines], self.floors[:],
+                           self.factories[:], self.pot[:], self.pot_one, self.player, self.key,
+                           self.first_player, self.bag)
+
+    def compute_key(self):
+        """Zobrist hash of the whole position (apply/undo update it incrementally)."""
+        key = PLAYER_KEYS[self.player]
+        for player, wall in enumerate(self.walls):
+            for square in range(25):
+                if wall >> square & 1:
+                    key ^= WALL_KEYS[player][square]
+            for row, (colour, count) in enumerate(self.lines[player]):
+                if count:
+                    key ^= LINE_KEYS[player][row][colour][count]
+            key ^= FLOOR_KEYS[player][self.floors[player]]
+        for factory_keys, factory in zip(FACTORY_KEYS, self.factories):
+            for colour in range(5):
+                key ^= factory_keys[colour][factory[colour]]
+        for colour in range(5):
+            key ^= POT_KEYS[colour][self.pot[colour]]
+        if self.pot_one:
+            key ^= POT_ONE_KEY
+        if self.first_player >= 0:
+            key ^= FIRST_PLAYER_KEYS[self.first_player]
+        return key
+
+    @property
+    def num_players(self):
+        return len(self.walls)
+
+    def is_terminal(self):
+        """Terminal when no coloured tiles are left in the factories or the pot (the end of the round)."""
+        return not any(self.pot) and all(factory == EMPTY_FACTORY for factory in self.factories)
+
+    def precedes(self, other):
+        """True if other can be reached from this position by playing on in the same round."""
+        if self.walls != other.walls or len(self.factories) != len(other.factories):
+            return False
+        if other.pot_one and not self.pot_one:
+            return False
+        for factory, other_factory in zip(self.factories, other.factories):
+            if factory != other_factory and other_factory != EMPTY_FACTORY:
+                return False
+        for player in range(len(self.walls)):
+            if self.floors[player] > other.floors[player]:
+                return False
+            for (colour, count), (other_colour, other_count) in zip(self.lines[player], other.lines[player]):
+                if count > other_count or (count and colour != other_colour):
+                    return False
+        return True
+
+    def legal_moves(self):
+        """
+        Return all moves for the player to move as (source, colour, count, line):
+        source: factory index, len(factories) is the pot
+        line: tower index 1..5, 0 is the minus tower
+        """
+        player = self.player
+        wall = self.walls[player]
+        lines = self.lines[player]
+        moves = []
+        for source, counts in enumerate(self.factories + [self.pot]):
+            for colour in range(5):
+                count = counts[colour]
+                if not count:
+                    continue
+                moves.append((source, colour, count, 0))
+                for row in range(5):
+                    line_colour, line_count = lines[row]
+                    if line_colour == -1:
+                        if not wall & WALL_BITS[row][colour]:
+                            moves.append((source, colour, count, row + 1))
+                    elif line_colour == colour and line_count <= row:
+                        moves.append((source, colour, count, row + 1))
+        return moves
+
+    def decode_move(self, code):
+        """The (source, colour, count, line) move of an encode_move code in this position."""
+        source, line = divmod(code, 6)
+        source, colour = divmod(source, 5)
+        counts = self.pot if source == len(self.factories) else self.factories[source]
+        return (source, colour, counts[colour], line)
+
+    def apply(self, move):
+        """Play move for the player to move, in place. Reverse it with undo(move)."""
+        source, colour, count, line = move
+        player = self.player
+        floor = self.floors[player]
+        line_before = self.lines[player][line - 1] if line else None
+        factory_before = None if source == len(self.factories) else self.factories[source]
+        self.history.append((player, floor, line_before, self.pot_one, factory_before, self.key))
+        key = self.key ^ FLOOR_KEYS[player][floor]
+
+        if source == len(self.factories):
+            # the first player to take from the pot also takes the 'one' tile
+            if self.pot_one:
+                self.pot_one = False
+                self.first_player = player
+                key ^= POT_ONE_KEY ^ FIRST_PLAYER_KEYS[player]
+                floor += 1
+            key ^= POT_KEYS[colour][count]
+            self.pot[colour] = 0
+        else:
+            # leftovers of the factory go to the pot
+            leftovers = self.factories[source]
+            factory_keys = FACTORY_KEYS[source]
+            for c in range(5):
+                key ^= factory_keys[c][leftovers[c]]
+                if c != colour and leftovers[c]:
+                    key ^= POT_KEYS[c][self.pot[c]]
+                    self.pot[c] += leftovers[c]
+                    key ^= POT_KEYS[c][self.pot[c]]
+            self.factories[source] = EMPTY_FACTORY
+
+        # fill the tower, anything that does not fit goes to the minus tower
+        overflow = count
+        if line:
+            line_colour, line_count = line_before
+            placed = min(count, line - line_count)
+            line_keys = LINE_KEYS[player][line - 1]
+            if line_count:
+                key ^= line_keys[line_colour][line_count]
+            key ^= line_keys[colour][line_count + placed]
+            self.lines[player][line - 1] = (colour, line_count + placed)
+            overflow -= placed
+        floor = min(FLOOR_SIZE, floor + overflow)
+        self.floors[player] = floor
+
+        self.player = (player + 1) % len(self.walls)
+        self.key = key ^ FLOOR_KEYS[player][floor] ^ PLAYER_KEYS[player] ^ PLAYER_KEYS[self.player]
+
+    def undo(self, move):
+        """Take back move, which must be the last move applied."""
+        source, colour, count, line = move
+        player, floor, line_before, pot_one, factory_before, self.key = self.history.pop()
+        self.player = player
+        self.floors[player] = floor
+        if line:
+            self.lines[player][line - 1] = line_before
+        self.pot_one = pot_one
+        if factory_before is None and pot_one:
+            self.first_player = -1
+        if factory_before is None:
+            self.pot[colour] = count
+        else:
+            for c in range(5):
+                if c != colour:
+                    self.pot[c] -= factory_before[c]
+            self.factories[source] = factory_before
@@ -0,0 +1,43 @@
+# Opening book: positions searched offline are found again when a CPU faces them in SinglePlayer
+import random
+import book2
+from state2 import COLOURS, SearchState, encode_move
+from book2 import opening_position, search_position, book_move, canonical, load_book, save_book
+
+
+def nice_state(state):
+    """The state as make_nice_state builds it from the sprites, with the factories in a shuffled order."""
+    nice = {"Gameboards": [], "Towers": [], "Factories": [], "Pot": ["one"] if state.pot_one else []}
+    factories = state.factories[:]
+    random.Random(0).shuffle(factories)
+    nice["Factories"] = [[COLOURS[colour] for colour in range(5) for _ in range(factory[colour])]
+                         for factory in factories]
+    nice["Pot"] += [COLOURS[colour] for colour in range(5) for _ in range(state.pot[colour])]
+    for player, wall in enumerate(state.walls):
+        nice["Gameboards"].append([["-"]*5 for _ in range(5)])
+        floor = ["one"] if state.first_player == player else []
+        floor += ["purple"]*(state.floors[player] - len(floor))
+        nice["Towers"].append([floor] + [[COLOURS[colour]]*count for colour, count in state.lines[player]])
+    return nice
+
+
+def test_book_move_for_a_cpu_seat(tmp_path, monkeypatch):
+    path = tmp_path / "opening_book.bin"
+    for num_players in (2, 3, 4):
+        for seat in range(1, num_players):
+            key, code = search_position((num_players, 7, seat, 50))
+            save_book({**load_book(path), key: code}, path)
+            monkeypatch.setattr(book2, "_book", load_book(path))
+
+            # as SinglePlayer.start_next_turn hands the CPU's turn to the worker
+            position = opening_position(num_players, 7, seat)
+            state = SearchState.from_nice_state(nice_state(position), seat)
+            move = book_move(state)
+            assert move is not None and move in state.legal_moves()
+            # the searched move, with the factories back in their places
+            source, colour, _, line = move
+            order = canonical(state)[1]
+            assert encode_move(order.index(source) if source < len(order) else source, colour, line) == code
+
+    # a position nobody searched isn't answered
+    assert book_move(opening_position(2, 8, 1)) is None
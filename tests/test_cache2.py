@@ -0,0 +1,40 @@
+# Evaluation cache: only values of the same settings are answered, and the seeded visits aren't stored again
+import pytest
+from cache2 import EvalCache, CACHE_MIN_VISITS, HEADER
+from mcts2 import Node
+
+
+def test_other_settings_clear_the_file(tmp_path):
+    path = str(tmp_path / "eval_cache.bin")
+    cache = EvalCache(path, slots=64, settings="a")
+    cache.store(12345, 0, 100, 0.5, 7)
+    cache.close()
+
+    cache = EvalCache(path, slots=64, settings="a")
+    assert cache.lookup(12345, 0) == (100, 0.5, 7)
+    # a file of an older layout
+    HEADER.pack_into(cache.map, 0, 1, HEADER.unpack_from(cache.map, 0)[1])
+    cache.close()
+    assert EvalCache(path, slots=64, settings="a").lookup(12345, 0) is None
+
+    cache = EvalCache(path, slots=64, settings="a")
+    cache.store(12345, 0, 100, 0.5, 7)
+    cache.close()
+    assert EvalCache(path, slots=64, settings="b").lookup(12345, 0) is None
+
+
+def test_store_tree_leaves_out_seeded_visits(tmp_path):
+    cache = EvalCache(str(tmp_path / "eval_cache.bin"), slots=64)
+    root = Node(1)
+    root.moves = [3, 4]
+    root.children = [Node(2), Node(3)]
+    root.visits, root.wins = 100, 60.0
+    root.seed_visits, root.seed_wins = 32, 32.0
+    root.children[0].visits = root.children[1].visits = CACHE_MIN_VISITS
+    root.children[1].seed_visits = 1
+    for child in root.children:
+        child.moves, child.children = [0], [Node()]
+    cache.store_tree(root, 0)
+    assert cache.lookup(1, 0) == (68, pytest.approx(28/68), 3)
+    assert cache.lookup(2, 0)[0] == CACHE_MIN_VISITS
+    assert cache.lookup(3, 0) is None  # one visit short of its own
@@ -0,0 +1,51 @@
+# Seeded random self-play: tiles are never created or lost, and the Zobrist key stays in step
+import random
+import pytest
+from state2 import COLOUR_MASKS, FLOOR_SIZE
+from game2 import Game
+
+
+def tile_totals(game):
+    """Tiles of each colour in the bag, the lid, the factories, the pot, the towers, the walls and the minus towers."""
+    state = game.state
+    totals = [bag + lid for bag, lid in zip(game.bag, game.lid)]
+    for counts in state.factories + [state.pot]:
+        for colour in range(5):
+            totals[colour] += counts[colour]
+    for player in range(game.num_players):
+        for colour, count in state.lines[player]:
+            if count:
+                totals[colour] += count
+        for colour in range(5):
+            totals[colour] += bin(state.walls[player] & COLOUR_MASKS[colour]).count("1")
+        for colour in game.floor_tiles[player]:
+            totals[colour] += 1
+    return totals
+
+
+@pytest.mark.parametrize("num_players", [2, 3, 4])
+def test_random_games_keep_tiles_and_key(num_players):
+    for seed in range(100):
+        game = Game(num_players, seed=seed)
+        rng = random.Random(seed)
+        assert tile_totals(game) == [20]*5
+        while not game.over:
+            game.apply(rng.choice(game.legal_moves()))
+            assert tile_totals(game) == [20]*5, (seed, game.round_number)
+            assert game.state.key == game.state.compute_key()
+
+
+def test_one_tile_onto_a_full_minus_tower():
+    game = Game(2, seed=108)
+    state = game.state
+    # from the bag: 7 purple tiles on player 0's minus tower and 2 yellow ones in the pot
+    game.bag[0] -= 7
+    game.floor_tiles[0] = [0]*7
+    state.floors[0] = FLOOR_SIZE
+    game.bag[3] -= 2
+    state.pot[3] = 2
+    state.key = state.compute_key()
+    assert tile_totals(game) == [20]*5
+    game.apply((len(state.factories), 3, 2, 4))
+    assert state.first_player == 0
+    assert tile_totals(game) == [20]*5
@@ -0,0 +1,42 @@
+# Dirty rect merging: what the window presents each frame
+import os
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # globals2 opens the window when imported
+pygame = pytest.importorskip("pygame")
+pygame.init()
+from globals2 import merge_dirty_rects, DIRTY_RECT_COST, MAX_DIRTY_RECTS
+
+
+def covers(merged, rects):
+    return all(any(cluster.contains(rect) for cluster in merged) for rect in map(pygame.Rect, rects))
+
+
+def test_nothing_to_draw():
+    assert merge_dirty_rects([]) == []
+    assert merge_dirty_rects([(10, 10, 0, 20), (5, 5, 30, 0)]) == []
+
+
+def test_overlapping_rects_merge():
+    assert merge_dirty_rects([(0, 0, 100, 100), (50, 50, 100, 100)]) == [pygame.Rect(0, 0, 150, 150)]
+    assert merge_dirty_rects([(0, 0, 100, 100), (0, 0, 100, 100), (20, 20, 10, 10)]) == [pygame.Rect(0, 0, 100, 100)]
+
+
+def test_adjacent_rects_merge():
+    assert merge_dirty_rects([(0, 0, 50, 50), (50, 0, 50, 50)]) == [pygame.Rect(0, 0, 100, 50)]
+
+
+def test_disjoint_rects_stay_apart():
+    rects = [(0, 0, 10, 10), (500, 500, 10, 10)]
+    merged = merge_dirty_rects(rects)
+    assert sorted(map(tuple, merged)) == rects
+    # merging would cost more than DIRTY_RECT_COST pixels
+    assert 510*510 - 200 > DIRTY_RECT_COST
+
+
+def test_at_most_max_dirty_rects():
+    # far enough apart that none would be merged for its cost
+    rects = [(i % 6*400, i // 6*400, 20, 20) for i in range(3*MAX_DIRTY_RECTS)]
+    merged = merge_dirty_rects(rects)
+    assert len(merged) == MAX_DIRTY_RECTS
+    assert covers(merged, rects)
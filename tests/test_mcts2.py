@@ -0,0 +1,14 @@
+# Leaf values of the hard search
+from state2 import EMPTY_FACTORY, SearchState
+from mcts2 import MCTS
+
+
+def test_lookahead_keeps_minus_tower_penalties():
+    # the round is over: player 0 completes the top wall row, which ends the game,
+    # and player 1 has nothing but 4 tiles on the minus tower
+    state = SearchState([0b11110, 0], [[(0, 1)] + [(-1, 0)]*4, [(-1, 0)]*5], [0, 4],
+                        [EMPTY_FACTORY]*5, [0]*5, False, 0, first_player=1, bag=(16, 20, 20, 20, 20))
+    mcts = MCTS(difficulty="hard", lookahead=8, seed=0)
+    # 5 for the tile and 2 for the row against -6, not the 0 points the scores can't go below
+    assert mcts._lookahead(state, 1) == -6 - 7
+    assert mcts._lookahead(state, 0) == 7 + 6
@@ -0,0 +1,36 @@
+# Batch rollouts must score their results exactly like the scalar get_reward
+import random
+import pytest
+from scoring2 import get_reward
+from game2 import Game
+
+np = pytest.importorskip("numpy")
+from rollout2 import BatchRollout
+
+
+def random_position(rng, num_players):
+    """Mid-round position of a seeded random game, its walls often made fuller to reach the bonuses."""
+    game = Game(num_players, seed=rng.getrandbits(32))
+    for _ in range(rng.randrange(120)):
+        if game.over:
+            break
+        game.apply(rng.choice(game.legal_moves()))
+    state = game.search_state()
+    if rng.random() < 0.5:
+        state.walls = [wall | sum(1 << square for square in range(25) if rng.random() < 0.6) for wall in state.walls]
+        state.key = state.compute_key()
+    return state
+
+
+@pytest.mark.parametrize("num_players", [2, 3, 4])
+def test_batch_rewards_match_get_reward(num_players):
+    rng = random.Random(num_players)
+    batch = BatchRollout(8, seed=num_players)
+    for trial in range(60):
+        state = random_position(rng, num_players)
+        batch.play_out(state, hard=trial % 2 == 0)
+        rewards = batch.rewards()
+        for b in range(batch.size):
+            final = batch.state(b)
+            assert final.is_terminal()
+            assert rewards[b].tolist() == pytest.approx(get_reward(final))
@@ -0,0 +1,79 @@
+# Mask-based scoring against walking a 5x5 grid square by square
+import random
+from state2 import WALL_BITS, wall_col
+from scoring2 import column_bits, placement_score, ROW_MASKS, COL_MASKS
+from game2 import Game, ROW_BONUS, COL_BONUS, COLOUR_BONUS
+
+
+def grid(wall):
+    return [[bool(wall >> (row*5 + col) & 1) for col in range(5)] for row in range(5)]
+
+
+def run(tiles, row, col, d_row, d_col):
+    """Tiles next to (row, col) in one direction, up to the first gap or the edge."""
+    count = 0
+    row, col = row + d_row, col + d_col
+    while 0 <= row < 5 and 0 <= col < 5 and tiles[row][col]:
+        count += 1
+        row, col = row + d_row, col + d_col
+    return count
+
+
+def reference_placement(wall, row, colour):
+    tiles = grid(wall)
+    col = wall_col(row, colour)
+    horizontal = run(tiles, row, col, 0, -1) + run(tiles, row, col, 0, 1)
+    vertical = run(tiles, row, col, -1, 0) + run(tiles, row, col, 1, 0)
+    if horizontal and vertical:
+        return horizontal + vertical + 2
+    return horizontal + vertical + 1
+
+
+def reference_bonus(wall):
+    tiles = grid(wall)
+    rows = sum(all(tiles[row]) for row in range(5))
+    cols = sum(all(tiles[row][col] for row in range(5)) for col in range(5))
+    colours = sum(all(tiles[row][wall_col(row, colour)] for row in range(5)) for colour in range(5))
+    return ROW_BONUS*rows + COL_BONUS*cols + COLOUR_BONUS*colours
+
+
+def random_walls(rng):
+    """Random walls, many with full rows, columns or colours laid over them."""
+    for _ in range(3000):
+        wall = sum(1 << square for square in range(25) if rng.random() < rng.random())
+        for _ in range(rng.randrange(3)):
+            kind, i = rng.randrange(3), rng.randrange(5)
+            if kind == 0:
+                wall |= ROW_MASKS[i]
+            elif kind == 1:
+                wall |= COL_MASKS[i]
+            else:
+                wall |= sum(WALL_BITS[row][i] for row in range(5))
+        yield wall
+
+
+def test_column_bits():
+    rng = random.Random(0)
+    for wall in random_walls(rng):
+        tiles = grid(wall)
+        for col in range(5):
+            assert column_bits(wall, col) == sum(tiles[row][col] << row for row in range(5))
+
+
+def test_placement_score():
+    rng = random.Random(1)
+    for wall in random_walls(rng):
+        for row in range(5):
+            for colour in range(5):
+                if not wall & WALL_BITS[row][colour]:
+                    assert placement_score(wall, row, colour) == reference_placement(wall, row, colour)
+
+
+def test_end_game_bonuses():
+    rng = random.Random(2)
+    game = Game(2, seed=0)
+    for wall in random_walls(rng):
+        game.scores = [0, 0]
+        game.state.walls = [wall, 0]
+        game.score_end_game()
+        assert game.scores == [reference_bonus(wall), 0]
@@ -0,0 +1,24 @@
+# The solver's round-end scores must be the game's
+import random
+from game2 import Game
+from solver2 import round_scores
+
+
+def test_round_scores_match_score_round():
+    rng = random.Random(1)
+    for seed in range(200):
+        game = Game(rng.choice([2, 3, 4]), seed=seed)
+        while not game.over:
+            state = game.state
+            move = rng.choice(game.legal_moves())
+            state.apply(move)
+            last_move = state.is_terminal()
+            state.undo(move)
+            if last_move and game.round_number > 1:
+                game.scores = [100]*game.num_players  # away from the floor at 0 points
+                state.apply(move)
+                expected = round_scores(state)
+                game.score_round()
+                assert [score - 100 for score in game.scores] == expected
+                break
+            game.apply(move)
@@ -0,0 +1,44 @@
+# In-place apply/undo: the Zobrist key follows every move, and undo restores the position exactly
+import random
+import pytest
+from state2 import FLOOR_SIZE
+from game2 import Game
+
+
+def snapshot(state):
+    return (state.walls[:], [lines[:] for lines in state.lines], state.floors[:], state.factories[:],
+            state.pot[:], state.pot_one, state.player, state.first_player, state.key)
+
+
+@pytest.mark.parametrize("num_players", [2, 3, 4])
+def test_apply_undo_round_trip(num_players):
+    rng = random.Random(num_players)
+    took_one = overflowed = 0
+    for seed in range(100):
+        game = Game(num_players, seed=seed)
+        # a few rounds in, so the walls aren't empty
+        for _ in range(rng.randrange(3*num_players*4)):
+            if game.over:
+                break
+            game.apply(rng.choice(game.legal_moves()))
+        state = game.search_state()
+        before = snapshot(state)
+        played, snapshots = [], []
+        while not state.is_terminal():
+            moves = state.legal_moves()
+            # half the time onto the minus tower, to fill it up and beyond
+            floor_moves = [move for move in moves if move[3] == 0]
+            move = rng.choice(floor_moves if floor_moves and rng.random() < 0.5 else moves)
+            player = state.player
+            took_one += move[0] == len(state.factories) and state.pot_one
+            overflowed += state.floors[player] + move[2] > FLOOR_SIZE and move[3] == 0
+            snapshots.append(snapshot(state))
+            state.apply(move)
+            played.append(move)
+            assert state.key == state.compute_key()
+        while played:
+            state.undo(played.pop())
+            assert snapshot(state) == snapshots.pop()
+            assert state.key == state.compute_key()
+        assert snapshot(state) == before
+    assert took_one and overflowed
@@ -0,0 +1,29 @@
+# Search workers: a worker process dying mid-search doesn't take the game down
+import time
+from game2 import Game
+from worker2 import SearchPool
+
+
+def search(pool, state, kill):
+    pool.submit(state, state.player + 1, "easy", workers=2)
+    for worker in pool.active[:kill]:
+        worker.process.kill()
+        worker.process.join()
+    while not (pool.done and pool.best_move):
+        time.sleep(0.01)
+        pool.poll()
+    move = pool.best_move
+    pool.stop()
+    return move
+
+
+def test_search_goes_on_without_a_dead_worker():
+    state = Game(2, seed=3).search_state()
+    pool = SearchPool()
+    try:
+        assert search(pool, state, kill=1) in state.legal_moves()
+        assert len(pool.workers) == 1
+        # with every worker gone the search starts over on a new one
+        assert search(pool, state, kill=2) in state.legal_moves()
+    finally:
+        pool.close()
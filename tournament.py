@@ -0,0 +1,120 @@
+# Headless self-play tournament between CPU settings, e.g.
+#   python tournament.py easy hard "hard:iterations=3000,c=1.0" --games 40
+# Each setting is a difficulty followed by optional budget/search options:
+#   ms, iterations, nodes (SearchBudget), c (c_param), batch (rollouts per leaf),
+#   select (uct or puct), lookahead (determinisations of the next round),
+#   solve (tile groups left at which the round is solved exactly, hard: SOLVE_GROUPS)
+import argparse, itertools, multiprocessing, random, time
+from game2 import *
+from mcts2 import *
+
+ELO_START = 1500
+ELO_K = 16
+
+
+class Player:
+    """A CPU setting parsed from its command line spec."""
+    def __init__(self, spec):
+        self.name = spec
+        difficulty, _, options = spec.partition(":")
+        options = dict(option.split("=") for option in options.split(",") if option)
+        self.difficulty = difficulty
+        # an explicit budget replaces the difficulty's one instead of adding to it
+        limits = {name: float(value) if name == "ms" else int(value)
+                  for name, value in options.items() if name in ("ms", "iterations", "nodes")}
+        self.budget = SearchBudget(**limits) if limits else SEARCH_BUDGETS[difficulty]
+        self.c_param = float(options.get("c", 1.4))
+        self.batch_size = int(options.get("batch", ROLLOUT_BATCH))
+        self.selection = options.get("select", "uct")
+        self.lookahead = int(options.get("lookahead", 0))
+        self.solve_below = int(options.get("solve", SOLVE_GROUPS if difficulty == "hard" else 0))
+
+    def choose_move(self, game, seed):
+        state = game.search_state()
+        mcts = MCTS(c_param=self.c_param, difficulty=self.difficulty, seed=seed, batch_size=self.batch_size,
+                    selection=self.selection, lookahead=self.lookahead, solve_below=self.solve_below)
+        root = Node(state.key)
+        return mcts.search(root, state, state.player + 1, self.budget)
+
+
+def play_game(args):
+    """Play one seeded game; returns (specs by seat, scores, winning seats, CPU seconds and moves per seat)."""
+    specs, seed = args
+    players = [Player(spec) for spec in specs]
+    game = Game(len(players), seed=seed)
+    cpu_seconds = [0.0]*len(players)
+    moves = [0]*len(players)
+    rng = random.Random(seed)
+    while not game.over:
+        seat = game.player
+        start = time.process_time()
+        move = players[seat].choose_move(game, rng.getrandbits(32))
+        cpu_seconds[seat] += time.process_time() - start
+        moves[seat] += 1
+        game.apply(move)
+    return specs, game.scores, game.winners(), cpu_seconds, moves
+
+
+def schedule(specs, games, num_players):
+    """Every group of num_players settings plays games games, rotating the seats, each with its own seed."""
+    jobs = []
+    seed = 0
+    for group in itertools.combinations(specs, num_players):
+        for game in range(games):
+            shift = game % num_players
+            jobs.append((group[shift:] + group[:shift], seed))
+            seed += 1
+    return jobs
+
+
+def update_elo(ratings, specs, scores):
+    """Pairwise Elo update from one game's final scores."""
+    changes = {spec: 0.0 for spec in specs}
+    for (a, score_a), (b, score_b) in itertools.combinations(zip(specs, scores), 2):
+        expected = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+        result = 1.0 if score_a > score_b else 0.5 if score_a == score_b else 0.0
+        changes[a] += ELO_K * (result - expected)
+        changes[b] -= ELO_K * (result - expected)
+    for spec, change in changes.items():
+        ratings[spec] += change
+
+
+def run(specs, games, num_players, processes=None):
+    jobs = schedule(specs, games, num_players)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(play_game, jobs)  # in job order, so the ratings don't depend on timing
+
+    ratings = {spec: ELO_START for spec in specs}
+    wins = {spec: 0.0 for spec in specs}
+    played = {spec: 0 for spec in specs}
+    total_scores = {spec: 0 for spec in specs}
+    cpu_seconds = {spec: 0.0 for spec in specs}
+    moves = {spec: 0 for spec in specs}
+    for game_specs, scores, winning_seats, game_cpu_seconds, game_moves in results:
+        update_elo(ratings, game_specs, scores)
+        winners = [game_specs[seat] for seat in winning_seats]
+        for seat, spec in enumerate(game_specs):
+            if spec in winners:
+                wins[spec] += 1 / len(winners)  # a shared win counts as a fraction
+            played[spec] += 1
+            total_scores[spec] += scores[seat]
+            cpu_seconds[spec] += game_cpu_seconds[seat]
+            moves[spec] += game_moves[seat]
+
+    print(f"{'setting':40} {'elo':>6} {'win %':>6} {'avg score':>9} {'cpu s/move':>10}")
+    for spec in sorted(specs, key=ratings.get, reverse=True):
+        print(f"{spec:40} {ratings[spec]:6.0f} {100*wins[spec]/played[spec]:6.1f} "
+              f"{total_scores[spec]/played[spec]:9.1f} {cpu_seconds[spec]/max(moves[spec], 1):10.4f}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Play CPU settings against each other without a window.")
+    parser.add_argument("settings", nargs="+", help="difficulty[:option=value,...], e.g. hard:iterations=3000,c=1.0")
+    parser.add_argument("--games", type=int, default=20, help="games per group of players")
+    parser.add_argument("--players", type=int, default=2, choices=range(2, MAX_PLAYERS + 1))
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    if len(args.settings) < args.players:
+        parser.error(f"need at least {args.players} settings")
+    run(args.settings, args.games, args.players, args.processes)
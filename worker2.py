@@ -0,0 +1,261 @@
+# Background CPU search, so MCTS never runs inside the render loop
+import os, random, signal, threading, time
+import multiprocessing
+from mcts2 import *
+from book2 import book_move
+from cache2 import *
+
+PROGRESS_INTERVAL = 0.05  # seconds of searching between progress messages
+# AZUGO_SEARCH_STATS=1 instruments the searches and shows where their time goes
+SEARCH_STATS = bool(os.environ.get("AZUGO_SEARCH_STATS"))
+
+
+def search_loop(conn):
+    """
+    Worker side of SearchWorker. Messages received:
+      ("search", search_id, state, player, difficulty, seed)  start a new search, dropping the old one
+      ("stop",)                                                go idle until the next search
+      ("quit",)
+    Messages sent while searching:
+      ("progress", search_id, iterations, root_visits, done)  root_visits: {move: visits}
+      ("stats", search_id, stats)                             SearchStats, with SEARCH_STATS only
+    The search runs until the SEARCH_BUDGETS entry of the difficulty is spent,
+    the last progress message has done set. Hard positions in the opening book,
+    close enough to the end of the round to solve exactly, or already searched
+    CACHE_ANSWER_VISITS times in the evaluation cache are answered straight
+    away; hard searches are stored in that cache when done.
+    Each CPU player's tree is kept between its turns and continued from the
+    position actually reached, so iterations count the visits reused too.
+    """
+    trees = {}  # player -> (mcts, root, state, difficulty) of its last search
+    searching = False
+    while True:
+        # block while idle, otherwise only check for new orders between batches
+        if not searching or conn.poll():
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            if message[0] == "search":
+                _, search_id, state, player, difficulty, seed = message
+                cache = get_eval_cache(CACHE_SETTINGS) if difficulty == "hard" else None
+                mcts, root = resume_search(trees.get(player), state, difficulty, seed, cache)
+                trees[player] = (mcts, root, state, difficulty)
+                move = book_move(state) if difficulty == "hard" else None
+                if move is None:
+                    move = mcts.solved_move(state)
+                if move is None and cache is not None:
+                    move = cached_move(cache, state, player)
+                if move is not None:
+                    conn.send(("progress", search_id, 1, {move: 1}, True))
+                    searching = False
+                    continue
+                mcts.start_budget(SEARCH_BUDGETS[difficulty])
+                searching = True
+            elif message[0] == "stop":
+                searching = False
+            elif message[0] == "quit":
+                return
+            continue
+
+        deadline = time.perf_counter() + PROGRESS_INTERVAL
+        while time.perf_counter() < deadline and mcts.budget_left():
+            mcts.iterate(root, state, player)
+        root_visits = mcts.root_visits(root, state)
+        # with nothing to choose from there is no point searching on
+        done = not root_visits or not mcts.budget_left()
+        conn.send(("progress", search_id, root.visits, root_visits, done))
+        if mcts.stats is not None:
+            conn.send(("stats", search_id, mcts.stats))
+        searching = not done
+        if done and cache is not None:
+            cache.store_tree(root, player - 1)
+
+
+def cached_move(cache, state, player):
+    """Stored best move of a position searched thoroughly before, None otherwise."""
+    cached = cache.lookup(state.key, player - 1)
+    if cached is None or cached[0] < CACHE_ANSWER_VISITS:
+        return None
+    move = state.decode_move(cached[2])
+    return move if move in state.legal_moves() else None
+
+
+# how resume_search's hard searches value positions: the cache only answers with values from the same settings
+CACHE_SETTINGS = repr((EVAL_VERSION, vars(SEARCH_BUDGETS["hard"]), ROLLOUT_BATCH if np is not None else 0, SOLVE_GROUPS))
+
+
+def resume_search(tree, state, difficulty, seed, cache=None):
+    """Return (mcts, root) for state, reusing the subtree of the previous search where possible."""
+    if tree is not None:
+        mcts, root, old_state, old_difficulty = tree
+        if old_difficulty == difficulty:
+            new_root = mcts.advance_root(root, old_state, state)
+            if new_root is not None:
+                return mcts, new_root
+    mcts = MCTS(difficulty=difficulty, seed=seed, batch_size=ROLLOUT_BATCH, cache=cache,
+                solve_below=SOLVE_GROUPS if difficulty == "hard" else 0, stats=SEARCH_STATS)
+    root = Node(state.key)
+    return mcts, root
+
+
+def search_process(conn):
+    # a forked worker inherits SDL's signal handlers, which would turn terminate() into a no-op
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    search_loop(conn)
+
+
+class SearchWorker:
+    """
+    Main-thread handle on a search process: submit() a position, then call
+    poll() once per frame and read iterations / best_move whenever needed;
+    done is set once the search has spent its budget.
+    Falls back to a thread where processes are not available (e.g. Android).
+    A worker whose process died (killed, crashed) is done without a move and
+    no longer alive.
+    """
+    def __init__(self):
+        self.conn, worker_conn = multiprocessing.Pipe()
+        try:
+            self.process = multiprocessing.Process(target=search_process, args=(worker_conn,), daemon=True)
+            self.process.start()
+        except (OSError, ImportError, RuntimeError):
+            self.process = threading.Thread(target=search_loop, args=(worker_conn,), daemon=True)
+            self.process.start()
+        self.search_id = 0
+        self.iterations = 0
+        self.root_visits = {}
+        self.best_move = None
+        self.done = False
+        self.stats = None
+        self.alive = True
+
+    @property
+    def in_process(self):
+        return isinstance(self.process, multiprocessing.Process)
+
+    def submit(self, state, player, difficulty, seed=None):
+        """Start searching state for player (UI 1-based index); replaces any running search."""
+        self.search_id += 1
+        self.iterations = 0
+        self.root_visits = {}
+        self.best_move = None
+        self.done = False
+        self._send(("search", self.search_id, state, player, difficulty, seed))
+
+    def _send(self, message):
+        try:
+            self.conn.send(message)
+        except OSError:  # BrokenPipeError: the process is gone
+            self._lost()
+
+    def _lost(self):
+        self.alive = False
+        self.root_visits = {}
+        self.best_move = None
+        self.done = True
+
+    def poll(self):
+        """Read all progress messages waiting, without blocking. Returns best_move."""
+        while self.alive:
+            try:
+                if not self.conn.poll():
+                    break
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                self._lost()
+                break
+            if message[0] == "stats":
+                if message[1] == self.search_id:
+                    self.stats = message[2]
+                continue
+            _, search_id, iterations, root_visits, done = message
+            if search_id == self.search_id:  # ignore messages from a replaced search
+                self.iterations = iterations
+                self.root_visits = root_visits
+                self.done = done
+                _, self.best_move = merge_root_visits([root_visits])
+        return self.best_move
+
+    def stop(self):
+        self._send(("stop",))
+
+    def close(self):
+        """Let the worker finish its batch and exit, rather than being killed with the program."""
+        self._send(("quit",))
+        self.process.join(timeout=1)
+
+
+class SearchPool:
+    """
+    Root-parallel search with the same API as SearchWorker: each worker grows
+    its own tree from the submitted position with its own seed, and the root
+    visit counts are summed before picking the best move.
+    Workers are started the first time they are needed and then kept. A worker
+    that dies is dropped, the others finish the search; when none is left the
+    search is submitted again to a new one.
+    """
+    def __init__(self):
+        self.workers = []
+        self.active = []
+        self.iterations = 0
+        self.root_visits = {}
+        self.best_move = None
+        self.done = False
+        self.stats = []  # SearchStats of the workers that sent some
+        self.search = None  # submit() arguments of the running search
+
+    def submit(self, state, player, difficulty, workers=1):
+        # threads share one core, so without processes a single worker is all we get
+        while len(self.workers) < workers and (not self.workers or self.workers[0].in_process):
+            self.workers.append(SearchWorker())
+        self.active = self.workers[:workers]
+        for worker in self.active:
+            worker.submit(state, player, difficulty, seed=random.getrandbits(32))
+        self.iterations = 0
+        self.root_visits = {}
+        self.best_move = None
+        self.done = False
+        self.search = (state, player, difficulty, workers)
+
+    def poll(self):
+        for worker in self.active:
+            worker.poll()
+        if not all(worker.alive for worker in self.active):
+            self.workers = [worker for worker in self.workers if worker.alive]
+            self.active = [worker for worker in self.active if worker.alive]
+            if not self.active:
+                self.submit(*self.search)
+        self.iterations = sum(worker.iterations for worker in self.active)
+        self.root_visits, self.best_move = merge_root_visits([worker.root_visits for worker in self.active])
+        self.done = all(worker.done for worker in self.active)
+        self.stats = [worker.stats for worker in self.active if worker.stats is not None]
+        return self.best_move
+
+    def stop(self):
+        for worker in self.active:
+            worker.stop()
+        self.active = []
+        self.search = None
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+        self.active = []
+
+
+def workers_for(difficulty):
+    """Easy thinks on one core, hard searches root-parallel on all of them."""
+    return 1 if difficulty == "easy" else (os.cpu_count() or 1)
+
+
+_search_pool = None
+
+def get_search_pool():
+    """Shared pool, its workers are started the first time a CPU needs to think."""
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = SearchPool()
+    return _search_pool